@@ -0,0 +1,748 @@
+#!/usr/bin/env python3
+"""
+Monthly Parquet archive with append-only deltas.
+
+Layout of an archive directory:
+
+    2026-08.parquet                     compacted base for the month
+    _delta/2026-08/<write-id>.parquet   rows appended since the last compaction
+
+Partitions are months unless the writer asks for days (append's
+partition_freq; see vintages.py), and are named the same way either way:
+2026-08-14.parquet, _delta/2026-08-14/. Below, "month" means either.
+
+Writers only ever add new delta files, so an hourly run costs I/O in
+proportion to the rows it brings in rather than the size of the month.
+Compaction folds a month's deltas into its base (dedup + sort) once enough
+of them pile up, and readers merge base + deltas with the same keep-last
+rule, so they see identical data either side of a compaction.
+
+Every file is sorted by city and holds one row group per city. Readers pass
+the city (and column) selection down to pyarrow, which skips other cities'
+row groups using their statistics, so reading one city touches only that
+city's bytes however many cities share the month.
+
+Files are written with an explicit schema: city dictionary-encoded,
+floats (float32, as the API returns them) with byte-stream-split encoding,
+and zstd compression.
+
+Each archive keeps a small index, _manifest.json, with per-month file lists
+and per-city min/max time and row counts. It is updated (atomically) by
+every append and compaction, so questions like "when does Perth's data end"
+are answered without opening any parquet file.
+
+Every file is written to a temporary name, fsynced and renamed into place
+(see storage.py), so an interrupted run never leaves a truncated file. A
+file that still fails to open is quarantined instead of breaking reads.
+
+Run standalone to compact every month of the default archives (the
+vintage archive only has its finished days sealed; --rewrite also
+rewrites months without deltas into the row-group-per-city layout;
+--reindex rebuilds the manifests from the files on disk; --verify checks
+every file first):
+
+    python archive.py [--rewrite] [--reindex] [--verify]
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import shutil
+import threading
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import instrument
+import storage
+
+DELTA_DIRNAME = "_delta"
+MANIFEST_NAME = "_manifest.json"
+
+# Compact a month once it has collected this many deltas. Observations only
+# write one when rows change: about one per city per newly fetched day, so
+# with 8 cities a month reaches this every three days or so
+COMPACT_AFTER_DELTAS = 24
+
+PARQUET_COMPRESSION = "zstd"
+PARQUET_COMPRESSION_LEVEL = 3
+
+
+# ─── Layout ──────────────────────────────────────────────────────────────────
+
+def base_path(archive_dir: Path, month: str) -> Path:
+    return archive_dir / f"{month}.parquet"
+
+
+def delta_dir(archive_dir: Path, month: str) -> Path:
+    return archive_dir / DELTA_DIRNAME / month
+
+
+def delta_paths(archive_dir: Path, month: str) -> list:
+    """Delta files for a month, oldest first (write ids sort by time)."""
+    return sorted(delta_dir(archive_dir, month).glob("*.parquet"))
+
+
+def months(archive_dir: Path, pattern: str = "*") -> list:
+    """All months ("YYYY-MM") with a base or deltas, oldest first."""
+    found = {p.stem for p in archive_dir.glob(f"{pattern}.parquet")}
+    deltas = archive_dir / DELTA_DIRNAME
+    if deltas.exists():
+        found |= {
+            d.name for d in deltas.glob(pattern)
+            if d.is_dir() and any(d.glob("*.parquet"))
+        }
+    return sorted(found)
+
+
+def month_files(archive_dir: Path, month: str) -> list:
+    """Base (if any) followed by deltas, in the order rows should be applied."""
+    base = base_path(archive_dir, month)
+    return ([base] if base.exists() else []) + delta_paths(archive_dir, month)
+
+
+def _write_id() -> str:
+    now = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    return f"{now}-{uuid.uuid4().hex[:8]}"
+
+
+# ─── Manifest ────────────────────────────────────────────────────────────────
+
+# {"months": {"2026-08": {"files": [relative paths],
+#                         "cities": {"Perth": {"min_time": iso, "max_time": iso,
+#                                              "rows": int}}}}}
+# Row counts include rows in pending deltas that compaction may later
+# dedup away; they are exact for compacted months.
+
+_manifest_lock = threading.RLock()
+
+
+def manifest_path(archive_dir: Path) -> Path:
+    return archive_dir / MANIFEST_NAME
+
+
+def _write_manifest(archive_dir: Path, manifest: dict):
+    storage.write_json(manifest_path(archive_dir), manifest, indent=2, sort_keys=True)
+
+
+def _city_stats(df: pd.DataFrame) -> dict:
+    stats = df.groupby("city", observed=True)["time"].agg(["min", "max", "count"])
+    return {
+        str(city): {
+            "min_time": row["min"].isoformat(),
+            "max_time": row["max"].isoformat(),
+            "rows": int(row["count"]),
+        }
+        for city, row in stats.iterrows()
+    }
+
+
+def _month_entry(archive_dir: Path, month: str, df: pd.DataFrame) -> dict:
+    return {
+        "files": [str(f.relative_to(archive_dir)) for f in month_files(archive_dir, month)],
+        "cities": _city_stats(df),
+    }
+
+
+def rebuild_manifest(archive_dir: Path) -> dict:
+    """Index every month from the files on disk (reads only city and time)."""
+    with _manifest_lock:
+        manifest = {"months": {}}
+        for month in months(archive_dir):
+            frames = [_read_file(f, columns=["city", "time"])
+                      for f in month_files(archive_dir, month)]
+            frames = [f for f in frames if not f.empty]
+            if frames:
+                manifest["months"][month] = _month_entry(
+                    archive_dir, month, pd.concat(frames, ignore_index=True)
+                )
+        if archive_dir.exists():
+            _write_manifest(archive_dir, manifest)
+        return manifest
+
+
+def load_manifest(archive_dir: Path) -> dict:
+    """The archive's manifest, building it first if it does not exist yet
+    (or cannot be parsed)."""
+    path = manifest_path(archive_dir)
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return rebuild_manifest(archive_dir)
+    instrument.file_read(path)
+    return manifest
+
+
+def _record_append(archive_dir: Path, month: str, path: Path, df: pd.DataFrame):
+    with _manifest_lock:
+        if not manifest_path(archive_dir).exists():
+            # Indexing the files on disk already picks up the new delta
+            rebuild_manifest(archive_dir)
+            return
+        manifest = load_manifest(archive_dir)
+        entry = manifest["months"].setdefault(month, {"files": [], "cities": {}})
+        entry["files"].append(str(path.relative_to(archive_dir)))
+        for city, new in _city_stats(df).items():
+            old = entry["cities"].get(city)
+            if old:
+                new = {
+                    "min_time": min(old["min_time"], new["min_time"]),
+                    "max_time": max(old["max_time"], new["max_time"]),
+                    "rows": old["rows"] + new["rows"],
+                }
+            entry["cities"][city] = new
+        _write_manifest(archive_dir, manifest)
+
+
+def _record_compaction(archive_dir: Path, month: str, df: pd.DataFrame):
+    with _manifest_lock:
+        if not manifest_path(archive_dir).exists():
+            rebuild_manifest(archive_dir)
+            return
+        manifest = load_manifest(archive_dir)
+        manifest["months"][month] = _month_entry(archive_dir, month, df)
+        _write_manifest(archive_dir, manifest)
+
+
+def city_months(archive_dir: Path, city: str | None, pattern: str = "*",
+                since: pd.Timestamp | None = None,
+                until: pd.Timestamp | None = None) -> list:
+    """Months matching `pattern` that hold rows for `city` (any city, if
+    None) with data in [since, until), from the manifest."""
+    found = []
+    for month, entry in load_manifest(archive_dir)["months"].items():
+        if not fnmatch.fnmatch(month, pattern):
+            continue
+        spans = [entry["cities"][city]] if city in entry["cities"] else []
+        if city is None:
+            spans = list(entry["cities"].values())
+        if any(
+            (since is None or pd.Timestamp(stats["max_time"]) >= since)
+            and (until is None or pd.Timestamp(stats["min_time"]) < until)
+            for stats in spans
+        ):
+            found.append(month)
+    return sorted(found)
+
+
+def city_time_range(archive_dir: Path, city: str) -> tuple | None:
+    """(min_time, max_time) for a city across the archive, from the manifest."""
+    spans = [
+        entry["cities"][city]
+        for entry in load_manifest(archive_dir)["months"].values()
+        if city in entry["cities"]
+    ]
+    if not spans:
+        return None
+    return (
+        pd.Timestamp(min(s["min_time"] for s in spans)),
+        pd.Timestamp(max(s["max_time"] for s in spans)),
+    )
+
+
+# ─── Schema ──────────────────────────────────────────────────────────────────
+
+def _encode(table: pa.Table) -> pa.Table:
+    """Apply the archive schema: dictionary-encoded city."""
+    i = table.schema.get_field_index("city")
+    if i < 0 or pa.types.is_dictionary(table.schema.field(i).type):
+        return table
+    city = table.column(i).cast(pa.string()).dictionary_encode()
+    return table.set_column(i, pa.field("city", city.type), city)
+
+
+def _write_options(schema: pa.Schema) -> dict:
+    """Encodings per column: dictionary for city and integers, byte stream
+    split for floats, delta for timestamps; everything zstd-compressed."""
+    dictionary = [f.name for f in schema
+                  if pa.types.is_dictionary(f.type) or pa.types.is_integer(f.type)]
+    encoding = {}
+    for f in schema:
+        if pa.types.is_floating(f.type):
+            encoding[f.name] = "BYTE_STREAM_SPLIT"
+        elif pa.types.is_timestamp(f.type):
+            encoding[f.name] = "DELTA_BINARY_PACKED"
+    return {
+        "compression": PARQUET_COMPRESSION,
+        "compression_level": PARQUET_COMPRESSION_LEVEL,
+        "use_dictionary": dictionary,
+        "column_encoding": encoding,
+    }
+
+
+# ─── Read / Write ────────────────────────────────────────────────────────────
+
+def _merge(frames: list, dedup_cols: list) -> pd.DataFrame:
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    df = df.drop_duplicates(subset=dedup_cols, keep="last")
+    return df.sort_values(dedup_cols).reset_index(drop=True)
+
+
+def _utc(ts: pd.Timestamp) -> pd.Timestamp:
+    """A time bound in UTC, like the stored times: pyarrow cannot compare a
+    UTC column with a timestamp in another zone at every resolution."""
+    ts = pd.Timestamp(ts)
+    return ts if ts.tzinfo is None else ts.tz_convert("UTC")
+
+
+def _read_file(path: Path, city: str | None = None, columns: list | None = None,
+               since: pd.Timestamp | None = None,
+               until: pd.Timestamp | None = None,
+               where: list | None = None) -> pd.DataFrame:
+    filters = list(where or [])
+    if city is not None:
+        filters.append(("city", "==", city))
+    if since is not None:
+        filters.append(("time", ">=", _utc(since)))
+    if until is not None:
+        filters.append(("time", "<", _utc(until)))
+    try:
+        with instrument.CountingFile(path) as f:
+            if columns is not None:
+                # Files written before a column was added simply lack it
+                names = pq.read_schema(f).names
+                columns = [c for c in columns if c in names]
+            table = pq.read_table(f, columns=columns, filters=filters or None)
+    except FileNotFoundError:
+        # Folded into the base by a concurrent compaction
+        return pd.DataFrame()
+    except (pa.ArrowNotImplementedError, pa.ArrowTypeError):
+        # A filter or projection the file's types cannot take: a bad query,
+        # not a damaged file
+        raise
+    except (pa.ArrowException, OSError) as e:
+        # Only a file whose own bytes fail to decode is moved aside; anything
+        # else (too many open files, permissions, a failing disk) is raised
+        try:
+            damaged = not _readable(path, pages=True)
+        except FileNotFoundError:
+            return pd.DataFrame()
+        if not damaged:
+            raise
+        quarantine(path, e)
+        return pd.DataFrame()
+    return table.to_pandas()
+
+
+def _write_file(df: pd.DataFrame, path: Path, sort_cols: list):
+    """Write `df` sorted by sort_cols, one row group per city."""
+    df = df.sort_values(sort_cols).reset_index(drop=True)
+    table = _encode(pa.Table.from_pandas(df, preserve_index=False))
+    options = _write_options(table.schema)
+    with storage.atomic_path(path) as tmp:
+        if "city" not in df.columns:
+            pq.write_table(table, tmp, **options)
+        else:
+            # Row groups split on city boundaries give each city its own
+            # min/max statistics, which is what lets filtered reads skip
+            # the others.
+            bounds = df.index[df["city"].ne(df["city"].shift())].tolist() + [len(df)]
+            with pq.ParquetWriter(tmp, table.schema, **options) as writer:
+                for lo, hi in zip(bounds, bounds[1:]):
+                    writer.write_table(table.slice(lo, hi - lo))
+    instrument.file_written(path)
+
+
+def _projection(columns: list | None, dedup_cols: list) -> list | None:
+    if columns is None:
+        return None
+    return list(dict.fromkeys(list(dedup_cols) + list(columns)))
+
+
+def read_month(archive_dir: Path, month: str, dedup_cols: list,
+               city: str | None = None, columns: list | None = None,
+               since: pd.Timestamp | None = None,
+               until: pd.Timestamp | None = None,
+               where: list | None = None) -> pd.DataFrame:
+    """Read a month as base + deltas, later rows winning on dedup_cols.
+
+    `city`, `columns`, the time range [since, until) and any extra `where`
+    filters (pyarrow (column, op, value) tuples) are pushed down to the
+    parquet reader; dedup_cols are always read.
+    """
+    columns = _projection(columns, dedup_cols)
+    return _merge(
+        [_read_file(f, city, columns, since, until, where)
+         for f in month_files(archive_dir, month)],
+        dedup_cols,
+    )
+
+
+def read(archive_dir: Path, dedup_cols: list, city: str | None = None,
+         month_keys: list | None = None, columns: list | None = None,
+         since: pd.Timestamp | None = None,
+         until: pd.Timestamp | None = None,
+         where: list | None = None) -> pd.DataFrame:
+    """Read several months (default: all) for one city or all cities."""
+    if month_keys is None:
+        month_keys = months(archive_dir)
+    frames = [
+        read_month(archive_dir, month, dedup_cols, city, columns, since, until, where)
+        for month in month_keys
+    ]
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+class ArchiveView:
+    """A lazy, filterable selection of an archive.
+
+    Building and narrowing a view reads nothing; `to_pandas()` resolves the
+    months from the manifest and reads only the selected city, columns and
+    time range from each file:
+
+        view = archive.view(ARCHIVE_DIR, ["city", "time"])
+        df = view.filter(city="Sydney", since=t).select(["temperature_2m"]).to_pandas()
+
+    Views are immutable: filter() and select() return new views.
+    """
+
+    def __init__(self, archive_dir: Path, dedup_cols: list,
+                 city: str | None = None, pattern: str = "*",
+                 since: pd.Timestamp | None = None,
+                 until: pd.Timestamp | None = None,
+                 columns: list | None = None,
+                 where: list | None = None):
+        self.archive_dir = archive_dir
+        self.dedup_cols = list(dedup_cols)
+        self.city = city
+        self.pattern = pattern
+        self.since = since
+        self.until = until
+        self.columns = columns
+        self.where = list(where or [])
+
+    def _replace(self, **changes) -> "ArchiveView":
+        fields = dict(vars(self), **changes)
+        return ArchiveView(**fields)
+
+    def filter(self, city: str | None = None, pattern: str | None = None,
+               since: pd.Timestamp | None = None,
+               until: pd.Timestamp | None = None,
+               where: list | None = None) -> "ArchiveView":
+        """Narrow to a city, a month pattern (e.g. "*-08"), [since, until)
+        and/or extra pyarrow filters on other columns."""
+        changes = {"where": self.where + list(where or [])}
+        if city is not None:
+            changes["city"] = city
+        if pattern is not None:
+            changes["pattern"] = pattern
+        if since is not None:
+            changes["since"] = since if self.since is None else max(self.since, since)
+        if until is not None:
+            changes["until"] = until if self.until is None else min(self.until, until)
+        return self._replace(**changes)
+
+    def select(self, columns: list) -> "ArchiveView":
+        """Read only `columns` (the dedup columns are always included)."""
+        if self.columns is not None:
+            columns = [c for c in columns if c in self.columns]
+        return self._replace(columns=list(columns))
+
+    def month_keys(self) -> list:
+        """Months that can hold selected rows, from the manifest."""
+        return city_months(self.archive_dir, self.city, self.pattern,
+                           self.since, self.until)
+
+    def to_pandas(self) -> pd.DataFrame:
+        month_keys = self.month_keys()
+        if not month_keys:
+            return pd.DataFrame()
+        return read(self.archive_dir, self.dedup_cols, self.city, month_keys,
+                    self.columns, self.since, self.until, self.where)
+
+
+def view(archive_dir: Path, dedup_cols: list) -> ArchiveView:
+    """A lazy view of a whole archive; narrow it with filter() and select()."""
+    return ArchiveView(archive_dir, dedup_cols)
+
+
+def append(df: pd.DataFrame, archive_dir: Path, dedup_cols: list,
+           partition_col: str = "time", partition_freq: str = "M") -> dict:
+    """Write `df` as one new delta per month (of `partition_col`) it spans,
+    or per day with partition_freq="D".
+
+    Returns {month: (delta_path, row_count)}. Existing files are never read
+    or rewritten.
+    """
+    if df.empty:
+        return {}
+
+    df = df.copy()
+    df["_ym"] = df[partition_col].dt.tz_localize(None).dt.to_period(partition_freq)
+
+    written = {}
+    write_id = _write_id()
+    for period, group in df.groupby("_ym"):
+        month = str(period)
+        path = delta_dir(archive_dir, month) / f"{write_id}.parquet"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        group = group.drop(columns=["_ym"])
+        _write_file(group, path, dedup_cols)
+        _record_append(archive_dir, month, path, group)
+        written[month] = (path, len(group))
+    return written
+
+
+def changed_rows(df: pd.DataFrame, archive_dir: Path, dedup_cols: list) -> pd.DataFrame:
+    """Rows of `df` that are new to the archive or differ from the stored
+    row with the same key (missing values compare equal).
+
+    Only the stored rows in df's cities and time range are read.
+    """
+    if df.empty:
+        return df
+    since, until = df["time"].min(), df["time"].max() + pd.Timedelta(microseconds=1)
+    month_keys = city_months(archive_dir, None, since=since, until=until)
+    cities = df["city"].unique().tolist()
+    stored = read(archive_dir, dedup_cols, month_keys=month_keys,
+                  columns=list(df.columns), since=since, until=until,
+                  where=[("city", "in", cities)]) if month_keys else pd.DataFrame()
+    if stored.empty or set(df.columns) - set(stored.columns):
+        return df
+
+    stored = stored[list(df.columns)].astype({c: df[c].dtype for c in dedup_cols})
+    merged = df.merge(stored, on=dedup_cols, how="left", suffixes=("", "_stored"),
+                      indicator=True)
+    same = (merged["_merge"] == "both").to_numpy().copy()
+    for col in df.columns.difference(dedup_cols):
+        new, old = merged[col], merged[f"{col}_stored"]
+        same &= ((new == old) | (new.isna() & old.isna())).to_numpy()
+    return df[~same]
+
+
+def compact_month(archive_dir: Path, month: str, dedup_cols: list,
+                  rewrite: bool = False) -> int:
+    """Fold a month's deltas into its base. Returns the base row count.
+
+    With `rewrite`, a base without deltas is still rewritten (to bring
+    files from before the row-group-per-city layout up to date).
+    """
+    deltas = delta_paths(archive_dir, month)
+    base = base_path(archive_dir, month)
+    if not deltas and not rewrite:
+        return pq.ParquetFile(base).metadata.num_rows if base.exists() else 0
+
+    # Only the deltas listed here are removed, so one appended while we
+    # compact survives for the next round.
+    merged = _merge(
+        [_read_file(f) for f in ([base] if base.exists() else []) + deltas],
+        dedup_cols,
+    )
+    if merged.empty:
+        return 0
+    _write_file(merged, base, dedup_cols)
+    for path in deltas:
+        path.unlink(missing_ok=True)
+    try:
+        delta_dir(archive_dir, month).rmdir()
+    except OSError:
+        pass
+    _record_compaction(archive_dir, month, merged)
+    return len(merged)
+
+
+def compact(archive_dir: Path, dedup_cols: list,
+            min_deltas: int = COMPACT_AFTER_DELTAS, rewrite: bool = False) -> dict:
+    """Compact every month with at least `min_deltas` deltas (or every
+    month, with `rewrite`).
+
+    Returns {month: row_count} for the months compacted.
+    """
+    compacted = {}
+    for month in months(archive_dir):
+        if rewrite or len(delta_paths(archive_dir, month)) >= max(min_deltas, 1):
+            compacted[month] = compact_month(archive_dir, month, dedup_cols, rewrite)
+    return compacted
+
+
+# ─── Repair ──────────────────────────────────────────────────────────────────
+
+# Files that fail to open are moved to _quarantine/<month>/ rather than
+# deleted or left to break every later read. The month's data is missing
+# until it is fetched again; _quarantine/<month>/_cities.json lists the
+# cities that lost rows with it (see quarantined_cities).
+
+QUARANTINE_DIRNAME = "_quarantine"
+LOST_CITIES_NAME = "_cities.json"
+
+
+def _archive_dir_of(path: Path) -> Path:
+    if path.parent.parent.name == DELTA_DIRNAME:
+        return path.parent.parent.parent
+    return path.parent
+
+
+def _month_of(path: Path) -> str:
+    return path.parent.name if path.parent.parent.name == DELTA_DIRNAME else path.stem
+
+
+def _indexed_month(archive_dir: Path, month: str) -> dict | None:
+    """A month's manifest entry as last written, without rebuilding it."""
+    try:
+        with open(manifest_path(archive_dir)) as f:
+            return json.load(f)["months"].get(month, {"files": [], "cities": {}})
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return None
+
+
+def _lost_cities(month_dir: Path) -> list | None:
+    try:
+        with open(month_dir / LOST_CITIES_NAME) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def quarantine(path: Path, reason: Exception | str = ""):
+    """Move an unreadable file aside, reindex its archive and note which
+    cities lost rows with it.
+
+    Those are the cities whose row count for the month dropped in the
+    reindex; if the file was not in the manifest, every city is noted.
+    """
+    archive_dir = _archive_dir_of(path)
+    month = _month_of(path)
+    before = _indexed_month(archive_dir, month)
+    month_dir = archive_dir / QUARANTINE_DIRNAME / month
+    known = _lost_cities(month_dir) if any(month_dir.glob("*.parquet")) else []
+    month_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        os.replace(path, month_dir / path.name)
+    except FileNotFoundError:
+        return
+    print(f"    Quarantined unreadable {path} ({reason})")
+    instrument.count("files_quarantined")
+    after = rebuild_manifest(archive_dir)["months"].get(month, {}).get("cities", {})
+
+    lost = None
+    indexed = before is not None and str(path.relative_to(archive_dir)) in before["files"]
+    if indexed and known is not None:
+        lost = sorted(set(known) | {
+            city for city, stats in before["cities"].items()
+            if after.get(city, {}).get("rows", 0) < stats["rows"]
+        })
+    storage.write_json(month_dir / LOST_CITIES_NAME, lost)
+
+
+def _footer(f) -> bytes:
+    """A parquet file's footer: its metadata, their length and the magic
+    bytes (empty if the file is too short to have one)."""
+    size = f.seek(0, os.SEEK_END)
+    if size < 12:
+        return b""
+    f.seek(size - 8)
+    length = int.from_bytes(f.read(4), "little")
+    if length > size - 12:
+        return b""
+    f.seek(size - 8 - length)
+    return f.read()
+
+
+def _readable(path: Path, pages: bool = False) -> bool:
+    """Whether the file's footer (and with `pages`, every page) decodes.
+
+    The bytes are read into memory before anything is decoded, so an error
+    reading them (permissions, too many open files, EIO) is raised rather
+    than mistaken for a damaged file.
+    """
+    with open(path, "rb") as f:
+        data = f.read() if pages else _footer(f)
+    try:
+        if pages:
+            pq.read_table(pa.BufferReader(data))
+        else:
+            pq.read_metadata(pa.BufferReader(data))
+    except (pa.ArrowException, OSError):
+        # Decoding bytes already in memory: any failure is in the bytes
+        return False
+    return True
+
+
+def verify(archive_dir: Path) -> list:
+    """Check every file's footer, quarantining any that fail to decode, and
+    clear temporary files left by interrupted writes. Run only while
+    nothing else writes to the archive. Returns the paths quarantined."""
+    if not archive_dir.exists():
+        return []
+    storage.remove_stale_tmp(archive_dir)
+    bad = [
+        path for month in months(archive_dir)
+        for path in month_files(archive_dir, month)
+        if not _readable(path)
+    ]
+    for path in bad:
+        quarantine(path, "failed verification")
+    if bad or not manifest_path(archive_dir).exists():
+        rebuild_manifest(archive_dir)
+    return bad
+
+
+def quarantined_cities(archive_dir: Path) -> dict:
+    """{month: cities} for every month with quarantined files whose data
+    has not been restored yet: the cities that lost rows with them, or None
+    where that is not known (every city did)."""
+    root = archive_dir / QUARANTINE_DIRNAME
+    if not root.exists():
+        return {}
+    return {
+        d.name: _lost_cities(d)
+        for d in sorted(root.iterdir())
+        if d.is_dir() and any(d.glob("*.parquet"))
+    }
+
+
+def clear_quarantine(archive_dir: Path, month_keys: list):
+    """Drop quarantined files for months that have been fetched again."""
+    for month in month_keys:
+        shutil.rmtree(archive_dir / QUARANTINE_DIRNAME / month, ignore_errors=True)
+
+
+# ─── Main ────────────────────────────────────────────────────────────────────
+
+def main(rewrite: bool = False, reindex: bool = False, verify_files: bool = False):
+    from open_meteo_scraper import archive_dirs, compact_archive
+
+    for archive_dir, dedup_cols in archive_dirs():
+        if not archive_dir.exists():
+            continue
+        if verify_files:
+            bad = verify(archive_dir)
+            print(f"  Verified {archive_dir} ({len(bad)} files quarantined)")
+        if reindex:
+            manifest = rebuild_manifest(archive_dir)
+            print(f"  Reindexed {archive_dir} ({len(manifest['months'])} months)")
+        compacted = compact_archive(archive_dir, dedup_cols, min_deltas=1, rewrite=rewrite)
+        for month, rows in compacted.items():
+            print(f"  Compacted {archive_dir / month}.parquet ({rows} rows)")
+        if not compacted:
+            print(f"  Nothing to compact in {archive_dir}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact the parquet archives.")
+    parser.add_argument(
+        "--rewrite", action="store_true",
+        help="rewrite every month, not just those with pending deltas",
+    )
+    parser.add_argument(
+        "--reindex", action="store_true",
+        help="rebuild each archive's manifest from the files on disk",
+    )
+    parser.add_argument(
+        "--verify", action="store_true",
+        help="check every file first, quarantining unreadable ones",
+    )
+    args = parser.parse_args()
+    main(rewrite=args.rewrite, reindex=args.reindex, verify_files=args.verify)
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the scrape → archive → combine pipeline.
+
+Replays Open-Meteo FlatBuffers responses through a local stand-in client,
+builds a synthetic archive of N cities × Y years with the scraper's own
+code paths, and times each stage:
+
+    decode       fetching + decoding responses into DataFrames
+    archive      save_to_parquet (delta appends)
+    compact      folding deltas into monthly bases
+    resume       get_last_observation_date (cold manifest, then warm)
+    json         latest observation / forecast JSON writes
+    combine      combine_city (cold climatology cache, then warm)
+    combine_pool combine.combine_cities across a process pool (warm cache)
+
+Each stage reports rows/s, process peak RSS and the Python-heap peak
+(tracemalloc). No network access is needed: responses are synthesised
+unless --replay points at a directory captured earlier with --record
+(which does need network), in which case the recorded values are reused
+for every request, re-timed to the requested range.
+
+    python benchmark.py --cities 8 --years 3 [--workers 4] [--output bench.json]
+    python benchmark.py --record bench_responses/
+    python benchmark.py --replay bench_responses/
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import resource
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import flatbuffers
+import numpy as np
+import pandas as pd
+from openmeteo_sdk.WeatherApiResponse import WeatherApiResponse
+
+import archive
+import combine
+import open_meteo_scraper as scraper
+
+BENCH_TZ = "Australia/Sydney"
+
+
+# ─── FlatBuffers ─────────────────────────────────────────────────────────────
+
+# Field slots from the openmeteo_sdk schema (vtable offset = 4 + 2 * slot)
+_RESPONSE_FIELDS = 15
+_RESPONSE_LATITUDE, _RESPONSE_LONGITUDE = 0, 1
+_RESPONSE_DAILY, _RESPONSE_HOURLY = 10, 11
+_BLOCK_FIELDS = 4
+_VARIABLE_FIELDS = 5
+_VARIABLE_VALUES = 3
+
+
+def encode_response(lat: float, lon: float, blocks: dict) -> bytes:
+    """Encode one size-prefixed WeatherApiResponse message.
+
+    `blocks` maps "hourly"/"daily" to (start, end, interval, [float arrays]).
+    """
+    b = flatbuffers.Builder(1024)
+    offsets = {}
+    for name, (start, end, interval, arrays) in blocks.items():
+        variables = []
+        for values in arrays:
+            vec = b.CreateNumpyVector(np.asarray(values, dtype=np.float32))
+            b.StartObject(_VARIABLE_FIELDS)
+            b.PrependUOffsetTRelativeSlot(_VARIABLE_VALUES, vec, 0)
+            variables.append(b.EndObject())
+        b.StartVector(4, len(variables), 4)
+        for offset in reversed(variables):
+            b.PrependUOffsetTRelative(offset)
+        variables_vec = b.EndVector()
+        b.StartObject(_BLOCK_FIELDS)
+        b.PrependInt64Slot(0, int(start), 0)
+        b.PrependInt64Slot(1, int(end), 0)
+        b.PrependInt32Slot(2, int(interval), 0)
+        b.PrependUOffsetTRelativeSlot(3, variables_vec, 0)
+        offsets[name] = b.EndObject()
+
+    b.StartObject(_RESPONSE_FIELDS)
+    b.PrependFloat32Slot(_RESPONSE_LATITUDE, lat, 0)
+    b.PrependFloat32Slot(_RESPONSE_LONGITUDE, lon, 0)
+    if "daily" in offsets:
+        b.PrependUOffsetTRelativeSlot(_RESPONSE_DAILY, offsets["daily"], 0)
+    if "hourly" in offsets:
+        b.PrependUOffsetTRelativeSlot(_RESPONSE_HOURLY, offsets["hourly"], 0)
+    b.FinishSizePrefixed(b.EndObject())
+    return bytes(b.Output())
+
+
+def decode_stream(data: bytes) -> list:
+    """Split a response body into WeatherApiResponse messages (as the client does)."""
+    messages, pos = [], 0
+    while pos < len(data):
+        length = int.from_bytes(data[pos:pos + 4], byteorder="little")
+        messages.append(WeatherApiResponse.GetRootAs(data, pos + 4))
+        pos += length + 4
+    return messages
+
+
+# ─── Stand-in client ─────────────────────────────────────────────────────────
+
+def _synthetic_values(var: str, times: np.ndarray, seed: int) -> np.ndarray:
+    """Plausible diurnal/seasonal series so downstream stats are realistic."""
+    rng = np.random.default_rng(seed)
+    hours = times / 3600.0
+    daily = np.sin(2 * np.pi * (hours % 24) / 24)
+    yearly = np.cos(2 * np.pi * (hours / 24 % 365.25) / 365.25)
+    noise = rng.standard_normal(len(times))
+    if "humidity" in var or "cloud" in var or "probability" in var:
+        return np.clip(60 - 20 * daily + 15 * noise, 0, 100)
+    if var.startswith("precipitation") or var in ("rain", "snowfall"):
+        return np.where(noise > 1.2, noise, 0.0)
+    return 18 + 6 * daily + 5 * yearly + 2 * noise
+
+
+class ReplayClient:
+    """Serves weather_api() calls locally, shaped exactly like the real API.
+
+    Each request gets one message per requested location covering the
+    requested time range, encoded to FlatBuffers and decoded back. Values
+    come from `templates` ({variable: array}, e.g. from a recording) tiled
+    to length, or are synthesised. Time spent encoding is tracked in
+    `encode_seconds` so it can be excluded from decode timings.
+    """
+
+    def __init__(self, templates: dict | None = None):
+        self.templates = templates or {}
+        self.requests = 0
+        self.encode_seconds = 0.0
+
+    def _values(self, var: str, times: np.ndarray, seed: int) -> np.ndarray:
+        template = self.templates.get(var)
+        if template is None or len(template) == 0:
+            return _synthetic_values(var, times, seed)
+        return np.resize(template, len(times))
+
+    def _block(self, variables: list, start: int, end: int, interval: int, seed: int):
+        times = np.arange(start, end, interval)
+        return (start, end, interval,
+                [self._values(var, times, seed + i) for i, var in enumerate(variables)])
+
+    def weather_api(self, url: str, params: dict) -> list:
+        began = time.perf_counter()
+        self.requests += 1
+        lats = np.atleast_1d(params["latitude"])
+        lons = np.atleast_1d(params["longitude"])
+
+        body = b""
+        for i, (lat, lon) in enumerate(zip(lats, lons)):
+            seed = int(abs(lat * 1000)) + i
+            if "archive" in url:
+                start = int(pd.Timestamp(params["start_hour"], tz="UTC").timestamp())
+                end = int((pd.Timestamp(params["end_hour"], tz="UTC")
+                           + pd.Timedelta(hours=1)).timestamp())
+                blocks = {"hourly": self._block(params["hourly"], start, end, 3600, seed)}
+            else:
+                start = int(pd.Timestamp.now(tz="UTC").floor("D").timestamp())
+                end = start + 16 * 86400
+                blocks = {
+                    "hourly": self._block(params["hourly"], start, end, 3600, seed),
+                    "daily": self._block(params["daily"], start, end, 86400, seed),
+                }
+            body += encode_response(float(lat), float(lon), blocks)
+
+        self.encode_seconds += time.perf_counter() - began
+        return decode_stream(body)
+
+
+def load_templates(replay_dir: Path) -> dict:
+    """Per-variable value arrays from responses captured with --record."""
+    meta = json.loads((replay_dir / "meta.json").read_text())
+    templates = {}
+    for kind, variables in meta.items():
+        messages = decode_stream((replay_dir / f"{kind}.bin").read_bytes())
+        hourly = messages[0].Hourly()
+        for i, var in enumerate(variables):
+            templates.setdefault(var, hourly.Variables(i).ValuesAsNumpy().copy())
+    return templates
+
+
+def record(replay_dir: Path):
+    """Capture one live archive and one live forecast response (needs network)."""
+    replay_dir.mkdir(parents=True, exist_ok=True)
+    client = scraper.setup_client()
+    geo = scraper.load_geocode_cache()
+    city = scraper.CITIES[0]
+    lat, lon = geo[city]["latitude"], geo[city]["longitude"]
+    end = datetime.now(timezone.utc) - timedelta(days=1)
+    requests = {
+        "archive": ("https://archive-api.open-meteo.com/v1/archive", {
+            "start_date": (end - timedelta(days=365)).strftime("%Y-%m-%d"),
+            "end_date": end.strftime("%Y-%m-%d"),
+            "hourly": scraper.HOURLY_VARS,
+        }),
+        "forecast": ("https://api.open-meteo.com/v1/forecast", {
+            "hourly": scraper.HOURLY_VARS + scraper.FORECAST_EXTRA_HOURLY_VARS,
+            "daily": scraper.DAILY_VARS,
+        }),
+    }
+    meta = {}
+    for kind, (url, params) in requests.items():
+        responses = client.weather_api(
+            url, params={"latitude": lat, "longitude": lon, "timezone": "UTC", **params}
+        )
+        (replay_dir / f"{kind}.bin").write_bytes(bytes(responses[0]._tab.Bytes))
+        meta[kind] = params["hourly"]
+        print(f"  Recorded {kind} response for {city}")
+    (replay_dir / "meta.json").write_text(json.dumps(meta, indent=2))
+
+
+# ─── Harness ─────────────────────────────────────────────────────────────────
+
+class Stage:
+    """Accumulates wall time and row counts for one pipeline stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.seconds = 0.0
+        self.rows = 0
+        self.py_peak = 0
+
+    @contextlib.contextmanager
+    def timed(self, rows: int = 0):
+        tracemalloc.reset_peak()
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds += time.perf_counter() - began
+            self.rows += rows
+            self.py_peak = max(self.py_peak, tracemalloc.get_traced_memory()[1])
+            self.peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    def report(self) -> dict:
+        return {
+            "stage": self.name,
+            "seconds": round(self.seconds, 3),
+            "rows": self.rows,
+            "rows_per_sec": round(self.rows / self.seconds) if self.seconds else None,
+            "peak_rss_mb": round(self.peak_rss / 1024, 1),
+            "py_peak_mb": round(self.py_peak / 2**20, 1),
+        }
+
+
+def point_at(workdir: Path):
+    """Redirect every data path the scraper and combine use into `workdir`."""
+    data = workdir / "new_data"
+    scraper.BASE_DIR = data
+    scraper.GEOCODE_CACHE_PATH = data / "geocode_cache.json"
+    scraper.BACKFILL_CURSOR_PATH = data / "backfill_cursor.json"
+    scraper.OBS_DIR = data / "observations"
+    scraper.OBS_ARCHIVE_DIR = scraper.OBS_DIR / "archive"
+    scraper.FORECAST_DIR = data / "forecasts"
+    scraper.FORECAST_ARCHIVE_DIR = scraper.FORECAST_DIR / "archive"
+    scraper.FORECAST_VINTAGE_DIR = scraper.FORECAST_DIR / "vintages"
+    combine.ARCHIVE_DIR = scraper.OBS_ARCHIVE_DIR
+    combine.FORECAST_DIR = scraper.FORECAST_DIR
+    combine.GEOCODE_CACHE = scraper.GEOCODE_CACHE_PATH
+    combine.CLIMATOLOGY_DIR = data / "climatology"
+    combine.OUTPUT_DIR = workdir / "cities"
+    scraper.ensure_dirs()
+
+
+def run(n_cities: int, n_years: int, client: ReplayClient, workdir: Path,
+        workers: int = combine.COMBINE_WORKERS) -> list:
+    point_at(workdir)
+    cities = [f"Bench{i:02d}" for i in range(n_cities)]
+    geo = {
+        city: {"latitude": -20.0 - i * 0.5, "longitude": 130.0 + i * 0.5}
+        for i, city in enumerate(cities)
+    }
+    limiter = scraper.RateLimiter(rate=1e9, burst=10**9)
+    end = datetime.now(timezone.utc) - timedelta(days=1)
+    start = (end - timedelta(days=365 * n_years)).strftime("%Y-%m-%d")
+    end = end.strftime("%Y-%m-%d")
+
+    stages = {name: Stage(name) for name in
+              ["decode", "archive", "compact", "resume", "json", "combine", "combine_pool"]}
+    batches = scraper._batched(cities, scraper.BATCH_SIZE)
+
+    # decode + archive: stream each batch's chunks into the archive
+    tails = {}
+    for batch in batches:
+        chunks = scraper.iter_observations_batch(
+            client, scraper._coords(geo, batch), start, end, limiter)
+        batch_tails = [pd.DataFrame() for _ in batch]
+        while True:
+            encode_before = client.encode_seconds
+            with stages["decode"].timed():
+                chunk = next(chunks, None)
+            stages["decode"].seconds -= client.encode_seconds - encode_before
+            if chunk is None:
+                break
+            frames, _ = chunk
+            stages["decode"].rows += sum(len(f) for f in frames)
+            for i, (city, frame) in enumerate(zip(batch, frames)):
+                with stages["archive"].timed(len(frame)):
+                    scraper.archive_observations(city, frame)
+                batch_tails[i] = scraper._recent(
+                    pd.concat([batch_tails[i], frame], ignore_index=True))
+        tails.update(zip(batch, batch_tails))
+
+    forecasts = {}
+    for batch in batches:
+        encode_before = client.encode_seconds
+        with stages["decode"].timed():
+            results = scraper.fetch_forecast_batch(client, scraper._coords(geo, batch), limiter)
+        stages["decode"].seconds -= client.encode_seconds - encode_before
+        for city, (hourly_df, daily_df) in zip(batch, results):
+            stages["decode"].rows += len(hourly_df) + len(daily_df)
+            forecasts[city] = (hourly_df, daily_df)
+
+    with stages["compact"].timed():
+        for archive_dir, dedup_cols in scraper.archive_dirs():
+            compacted = archive.compact(archive_dir, dedup_cols, min_deltas=1)
+            stages["compact"].rows += sum(compacted.values())
+
+    archive.manifest_path(scraper.OBS_ARCHIVE_DIR).unlink()
+    for _ in range(2):  # cold (rebuilds the manifest), then warm
+        for city in cities:
+            with stages["resume"].timed(1):
+                scraper.get_last_observation_date(city, scraper.OBS_ARCHIVE_DIR)
+
+    for city in cities:
+        hourly_df, daily_df = forecasts[city]
+        with stages["json"].timed(len(tails[city]) + len(hourly_df) + len(daily_df)):
+            scraper.save_observations(city, tails[city])
+            scraper.save_forecast(city, hourly_df, daily_df)
+
+    for _ in range(2):  # cold (builds the climatology cache), then warm
+        for city in cities:
+            with stages["combine"].timed(1):
+                combine.combine_city(city, BENCH_TZ)
+
+    with stages["combine_pool"].timed(len(cities)):
+        combine.combine_cities({city: BENCH_TZ for city in cities}, workers)
+
+    return [stage.report() for stage in stages.values()]
+
+
+def print_report(results: list):
+    print(f"\n{'stage':<13}{'seconds':>10}{'rows':>12}{'rows/s':>12}"
+          f"{'peak RSS MB':>14}{'py peak MB':>12}")
+    for r in results:
+        print(f"{r['stage']:<13}{r['seconds']:>10.3f}{r['rows']:>12}"
+              f"{r['rows_per_sec'] or 0:>12}{r['peak_rss_mb']:>14.1f}{r['py_peak_mb']:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmark.")
+    parser.add_argument("--cities", type=int, default=8)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=combine.COMBINE_WORKERS,
+                        help="processes for the combine_pool stage")
+    parser.add_argument("--replay", type=Path,
+                        help="directory of responses captured with --record")
+    parser.add_argument("--record", type=Path,
+                        help="capture live responses into this directory and exit")
+    parser.add_argument("--output", type=Path, help="also write results as JSON")
+    parser.add_argument("--keep", action="store_true",
+                        help="keep the temporary working directory")
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record)
+        return
+
+    client = ReplayClient(load_templates(args.replay) if args.replay else None)
+    workdir = Path(tempfile.mkdtemp(prefix="oz_weather_bench_"))
+    print(f"Benchmark: {args.cities} cities × {args.years} years in {workdir}")
+
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = run(args.cities, args.years, client, workdir, args.workers)
+    finally:
+        tracemalloc.stop()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(results)
+    print(f"\n{client.requests} API requests replayed")
+    if args.output:
+        args.output.write_text(json.dumps({
+            "cities": args.cities,
+            "years": args.years,
+            "replay": str(args.replay) if args.replay else None,
+            "requests": client.requests,
+            "stages": results,
+        }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,33 @@
 #!/usr/bin/env python3
-"""Combine historical observations and forecast data into per-city JSON files."""
+"""Combine historical observations and forecast data into per-city JSON files.
 
+Cities are combined in a process pool; shared inputs are read once in the
+parent (or handed over by the scraper). Output is written in OUTPUT_FORMAT,
+plus cities/_bundle.json holding every city's payload.
+
+    python combine.py [--workers N]
+"""
+
+import argparse
+import hashlib
 import json
-import math
+import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 import pytz
 
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+import archive
+import instrument
+import storage
+
 # Configuration
 CITIES = ["Melbourne", "Sydney"]
 VARIABLES = ["temperature_2m", "cloud_cover", "precipitation", "relative_humidity_2m"]
@@ -20,13 +39,24 @@ TODAY_ONLY_VARS = ["cloud_cover"]
 BAND_VARS = ["temperature_2m", "relative_humidity_2m"]
 # Variables to strip historic entries from (keep only today + future)
 TODAY_FUTURE_VARS = ["temperature_2m", "relative_humidity_2m", "precipitation"]
+# Archive columns read by combine (the rest of HOURLY_VARS is never decoded)
+OBS_COLUMNS = list(dict.fromkeys(VARIABLES + BAND_VARS))
 
 BASE_DIR = Path(__file__).parent
 ARCHIVE_DIR = BASE_DIR / "new_data" / "observations" / "archive"
 FORECAST_DIR = BASE_DIR / "new_data" / "forecasts"
 GEOCODE_CACHE = BASE_DIR / "new_data" / "geocode_cache.json"
+CLIMATOLOGY_DIR = BASE_DIR / "new_data" / "climatology"
 OUTPUT_DIR = BASE_DIR / "dash" / "static" / "cities"
 
+# City file layout: "compact" or "records" (see the module docstring)
+OUTPUT_FORMAT = "compact"
+# Spacing of the hourly series, in seconds, in compact payloads
+SERIES_STEP = 3600
+
+# Processes combining cities in parallel (1 combines them in this process)
+COMBINE_WORKERS = min(8, os.cpu_count() or 1)
+
 
 def load_city_timezones():
     with open(GEOCODE_CACHE) as f:
@@ -34,43 +64,180 @@ def load_city_timezones():
     return {city: data["timezone"] for city, data in cache.items()}
 
 
-def load_observations(city, tz, today):
-    """Load all parquet files for the current month, filter to city.
+def load_observations(city, tz, today, since=None):
+    """Load the current month of every year from the archive, for one city.
 
     Returns all days in the month across all years (not just today's day),
-    giving a richer set of ghost lines.
+    or only rows from `since` onwards. The city, time and OBS_COLUMNS
+    selection is pushed down to the parquet reader, so other cities' row
+    groups and unused variables are never decoded.
     """
-    month = today.month
-    pattern = f"*-{month:02d}.parquet"
-    files = sorted(ARCHIVE_DIR.glob(pattern))
-
-    if not files:
+    df = (
+        archive.view(ARCHIVE_DIR, ["city", "time"])
+        .filter(city=city, pattern=f"*-{today.month:02d}", since=since)
+        .select(OBS_COLUMNS)
+        .to_pandas()
+    )
+    if df.empty:
         return pd.DataFrame()
 
-    dfs = []
-    for f in files:
-        df = pd.read_parquet(f)
-        df = df[df["city"] == city]
-        if df.empty:
-            continue
-        dfs.append(df)
+    df["time"] = pd.to_datetime(df["time"], utc=True)
+    return df
 
-    if not dfs:
+
+def load_recent_observations(cities, today, since, until=None):
+    """Observations in [since, until) in this month of the archive, for
+    several cities in one read (the cities' row groups of each file are read
+    together rather than file by file per city)."""
+    df = (
+        archive.view(ARCHIVE_DIR, ["city", "time"])
+        .filter(pattern=f"*-{today.month:02d}", since=since, until=until,
+                where=[("city", "in", list(cities))])
+        .select(OBS_COLUMNS)
+        .to_pandas()
+    )
+    if df.empty:
         return pd.DataFrame()
 
-    df = pd.concat(dfs, ignore_index=True)
     df["time"] = pd.to_datetime(df["time"], utc=True)
     return df
 
 
+def climatology_path(city, month):
+    return CLIMATOLOGY_DIR / f"{city}-{month:02d}.parquet"
+
+
+def _read_climatology(path):
+    """(rows, meta) from a cache file, or None if it is missing, unreadable
+    or for other BAND_VARS (a cache is only ever rebuilt, never repaired)."""
+    try:
+        table = pq.read_table(path)
+        meta = json.loads(table.schema.metadata[b"climatology"])
+        clim = pd.DataFrame({
+            "key": table.column("key").to_numpy().astype(np.int64),
+            "value": table.column("value").to_numpy().astype("float64"),
+        })
+    except FileNotFoundError:
+        return None
+    except (pa.ArrowException, OSError, KeyError, TypeError, ValueError) as e:
+        print(f"  Discarding unreadable climatology cache {path} ({e})")
+        return None
+    instrument.file_read(path)
+    if meta.get("variables") != BAND_VARS:
+        return None
+    return clim, meta
+
+
+def _write_climatology(clim, through, months, path):
+    table = pa.table({
+        "key": pa.array(clim["key"].to_numpy(), pa.int16()),
+        # Archive values are float32, so this keeps them exactly
+        "value": pa.array(clim["value"].to_numpy(), pa.float64()).cast(pa.float32()),
+    })
+    meta = {"through": through.isoformat(), "months": months, "variables": BAND_VARS}
+    table = table.replace_schema_metadata({b"climatology": json.dumps(meta).encode()})
+    with storage.atomic_path(path) as tmp:
+        pq.write_table(table, tmp)
+    instrument.file_written(path)
+
+
+def _climatology_rows(obs, tz):
+    """(keys, values) for the non-missing BAND_VARS values in `obs`, key
+    being 24 * the variable's position in BAND_VARS + the local hour."""
+    hours = obs["time"].dt.tz_convert(tz).dt.hour.to_numpy(dtype=np.int64)
+    keys, values = [], []
+    for i, var in enumerate(BAND_VARS):
+        if var in obs.columns:
+            keys.append(hours + 24 * i)
+            values.append(obs[var].to_numpy(dtype="float64", na_value=np.nan))
+    if not keys:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    keys, values = np.concatenate(keys), np.concatenate(values)
+    valid = ~np.isnan(values)
+    return keys[valid], values[valid]
+
+
+def _insert_sorted(keys, values, new_keys, new_values):
+    """Insert (key, value) pairs into arrays sorted by key then value.
+
+    Only the new pairs are sorted; each is placed by a binary search within
+    its key's run.
+    """
+    order = np.lexsort((new_values, new_keys))
+    new_keys, new_values = new_keys[order], new_values[order]
+    bounds = np.searchsorted(keys, np.arange(24 * len(BAND_VARS) + 1))
+    pos = np.empty(len(new_keys), dtype=np.int64)
+    for key in np.unique(new_keys):
+        run = new_keys == key
+        lo, hi = bounds[key], bounds[key + 1]
+        pos[run] = lo + np.searchsorted(values[lo:hi], new_values[run], side="right")
+    return np.insert(keys, pos, new_keys), np.insert(values, pos, new_values)
+
+
+def load_climatology(city, tz, today, rebuild=False):
+    """BAND_VARS observations for this calendar month of every year, as
+    (key, value) rows sorted into one run per (variable, local hour).
+    Cached per (city, month) in CLIMATOLOGY_DIR and extended incrementally."""
+    month = today.month
+    pattern = f"*-{month:02d}"
+    path = climatology_path(city, month)
+    archive_months = archive.city_months(ARCHIVE_DIR, city, pattern)
+    if not archive_months:
+        return pd.DataFrame()
+
+    cache = None if rebuild else _read_climatology(path)
+    if cache is not None:
+        clim, meta = cache
+        # Stored hours never change, so only rows after "through" are new
+        since = pd.Timestamp(meta["through"]) + pd.Timedelta(microseconds=1)
+        delta_months = archive.city_months(ARCHIVE_DIR, city, pattern, since)
+        if not set(archive_months) - set(meta["months"]) - set(delta_months):
+            delta = (load_observations(city, tz, today, since=since)
+                     if delta_months else pd.DataFrame())
+            if delta.empty:
+                return clim
+            keys, values = _insert_sorted(
+                clim["key"].to_numpy(), clim["value"].to_numpy(),
+                *_climatology_rows(delta, tz),
+            )
+            clim = pd.DataFrame({"key": keys, "value": values})
+            _write_climatology(clim, delta["time"].max(), archive_months, path)
+            return clim
+
+    obs = load_observations(city, tz, today)
+    if obs.empty:
+        return pd.DataFrame()
+    keys, values = _climatology_rows(obs, tz)
+    order = np.lexsort((values, keys))
+    clim = pd.DataFrame({"key": keys[order], "value": values[order]})
+    _write_climatology(clim, obs["time"].max(), archive_months, path)
+    return clim
+
+
 def load_forecast(city):
-    """Load forecast JSON for a city."""
+    """Load a city's hourly forecast: from the Feather sidecar the scraper
+    writes next to the JSON (typed, so nothing is parsed), or from the JSON
+    if there is no readable sidecar."""
+    sidecar = FORECAST_DIR / f"{city}.feather"
+    try:
+        df = feather.read_table(sidecar).to_pandas()
+    except FileNotFoundError:
+        pass
+    except (pa.ArrowException, OSError) as e:
+        print(f"  Ignoring unreadable forecast sidecar {sidecar} ({e})")
+    else:
+        instrument.file_read(sidecar)
+        # Same UTC type as the observations, so the two concatenate
+        df["time"] = pd.to_datetime(df["time"], utc=True)
+        return df
+
     forecast_file = FORECAST_DIR / f"{city}.json"
     if not forecast_file.exists():
         return pd.DataFrame()
 
     with open(forecast_file) as f:
         data = json.load(f)
+    instrument.file_read(forecast_file)
 
     records = data.get("hourly", [])
     if not records:
@@ -81,15 +248,227 @@ def load_forecast(city):
     return df
 
 
-def combine_city(city, tz_name):
-    tz = pytz.timezone(tz_name)
-    today = datetime.now(tz)
+def _isoformat(times):
+    """Vectorised Timestamp.isoformat() for whole-second, tz-aware times."""
+    s = times.dt.strftime("%Y-%m-%dT%H:%M:%S%z")
+    return s.str[:-2] + ":" + s.str[-2:]
+
+
+def _round1(values):
+    """round(v, 1) over an array, matching Python's correctly-rounded round().
+
+    np.round scales by 10 first, which can land on the wrong side of a tie
+    (0.15 is stored just below 0.15); those few values go through round().
+    """
+    scaled = values * 10
+    out = np.round(scaled) / 10
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_half.any():
+        out[near_half] = [round(v, 1) for v in values[near_half].tolist()]
+    return out
 
-    obs = load_observations(city, tz, today)
-    forecast = load_forecast(city)
+
+def _series_rows(combined, variables, today_str):
+    """(var, keep, rounded values) for every variable in `combined`.
+
+    NaNs, rows outside TODAY_ONLY_VARS / TODAY_FUTURE_VARS windows and
+    rounding are handled as array operations; `keep` selects the rows of
+    `combined` that belong in the variable's series.
+    """
+    dates = combined["time"].dt.strftime("%Y-%m-%d")
+    is_today = (dates == today_str).to_numpy()
+    from_today = (dates >= today_str).to_numpy()
+
+    for var in variables:
+        if var not in combined.columns:
+            continue
+        values = combined[var].to_numpy(dtype="float64", na_value=np.nan)
+        keep = ~np.isnan(values)
+        if var in TODAY_ONLY_VARS:
+            keep &= is_today
+        if var in TODAY_FUTURE_VARS:
+            keep &= from_today
+        yield var, keep, _round1(values[keep])
+
+
+def build_series(combined, variables, today_str):
+    """Build the {"time", "value"} records for every variable in one pass.
+
+    Timestamps are formatted once for the whole frame.
+    """
+    times = _isoformat(combined["time"]).to_numpy()
+    return {
+        var: [{"time": t, "value": v} for t, v in zip(times[keep].tolist(), values.tolist())]
+        for var, keep, values in _series_rows(combined, variables, today_str)
+    }
+
+
+def _nullable(values):
+    """An array as a list, with NaN as None (JSON null)."""
+    return [None if v != v else v for v in values.tolist()]
+
+
+def build_series_compact(combined, variables, today_str):
+    """Build {"start", "step", "values"} series for every variable.
+
+    `start` is the first kept hour (local ISO time); values[i] is the
+    value at start + i * step seconds, null where the series has a gap.
+    """
+    times = combined["time"]
+    offsets = (times - times.iloc[0]).dt.total_seconds().to_numpy() // SERIES_STEP
+    offsets = offsets.astype(np.int64)
+
+    output = {}
+    for var, keep, values in _series_rows(combined, variables, today_str):
+        if not keep.any():
+            output[var] = {"start": None, "step": SERIES_STEP, "values": []}
+            continue
+        first = np.flatnonzero(keep)[0]
+        slots = offsets[keep] - offsets[first]
+        filled = np.full(slots[-1] + 1, np.nan)
+        filled[slots] = values
+        output[var] = {
+            "start": times.iloc[first].isoformat(),
+            "step": SERIES_STEP,
+            "values": _nullable(filled),
+        }
+    return output
+
+
+def _segment_quantile(values, start, n, q):
+    """Linear interpolation quantile of the sorted runs values[start:start+n].
+
+    Same arithmetic as the JS implementation (pos = q * (n - 1), then lerp
+    between the neighbouring values), applied to every run at once. Empty
+    runs give NaN.
+    """
+    pos = q * (n - 1)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.ceil(pos).astype(np.int64)
+    last = max(len(values) - 1, 0)
+    v_lo = values[np.clip(start + lo, 0, last)]
+    v_hi = values[np.clip(start + hi, 0, last)]
+    with np.errstate(invalid="ignore"):
+        result = np.where(lo == hi, v_lo, v_lo + (v_hi - v_lo) * (pos - lo))
+    return np.where(n > 0, result, np.nan)
+
+
+def hourly_bands(clim, variables):
+    """Hourly means and band boundaries from load_climatology's sorted runs:
+    {var: (avg, boundaries)}, boundaries being a (24, 7) array of min, below
+    1/3, below 2/3, mean, above 1/3, above 2/3, max per hour."""
+    if clim.empty:
+        return {}
+
+    n_keys = 24 * len(variables)
+    keys = clim["key"].to_numpy(dtype=np.int64)
+    values = clim["value"].to_numpy(dtype="float64")
+    count = np.bincount(keys, minlength=n_keys)
+    start = np.concatenate([[0], np.cumsum(count)[:-1]])
+    with np.errstate(invalid="ignore"):
+        avg_by_key = np.bincount(keys, weights=values, minlength=n_keys) / count
+    n_below = np.bincount(keys, weights=values <= avg_by_key[keys], minlength=n_keys)
+    n_below = n_below.astype(np.int64)
+    n_above = count - n_below
+    above_start = start + n_below
+
+    def above(q):
+        return np.where(n_above > 0,
+                        _segment_quantile(values, above_start, n_above, q), avg_by_key)
+
+    boundaries = np.column_stack([
+        _segment_quantile(values, start, n_below, 0),
+        _segment_quantile(values, start, n_below, 1 / 3),
+        _segment_quantile(values, start, n_below, 2 / 3),
+        avg_by_key,
+        above(1 / 3),
+        above(2 / 3),
+        above(1),
+    ])
+    boundaries[(count == 0) | np.isnan(avg_by_key)] = np.nan
+
+    return {
+        var: (avg_by_key[i * 24:(i + 1) * 24], boundaries[i * 24:(i + 1) * 24])
+        for i, var in enumerate(variables)
+    }
+
+
+def build_bands(clim, variables):
+    """The {var}_avg and {var}_bands output entries for `variables`."""
+    stats = hourly_bands(clim, variables)
+    output = {}
+    for var, (avg, _) in stats.items():
+        output[f"{var}_avg"] = [
+            {"hour": h, "value": round(v, 1)}
+            for h, v in enumerate(avg.tolist())
+            if not np.isnan(v)
+        ]
+
+    for var, (_, boundaries) in stats.items():
+        hours = np.flatnonzero(~np.isnan(boundaries[:, 3]))
+        rounded = _round1(boundaries[hours])
+        output[f"{var}_bands"] = [
+            [
+                {"hour": int(h), "lower": lower, "upper": upper}
+                for h, lower, upper in zip(
+                    hours.tolist(), rounded[:, b].tolist(), rounded[:, b + 1].tolist()
+                )
+            ]
+            for b in range(6)
+        ]
+    return output
+
+
+def build_bands_compact(clim, variables):
+    """The averages and bands for `variables` as 24-slot arrays.
+
+    {"averages": {var: [mean per hour]}, "bands": {var: [[min, below 1/3,
+    below 2/3, mean, above 1/3, above 2/3, max] per hour]}}, with null for
+    hours without data. Band b of the records format spans columns b and
+    b + 1 of a row.
+    """
+    stats = hourly_bands(clim, variables)
+    averages, bands = {}, {}
+    for var, (avg, boundaries) in stats.items():
+        averages[var] = [None if np.isnan(v) else round(v, 1) for v in avg.tolist()]
+        rounded = _round1(boundaries)
+        bands[var] = [None if np.isnan(row[3]) else _nullable(row) for row in rounded]
+    return {"averages": averages, "bands": bands}
+
+
+def observations_since(today, tz_name, forecast):
+    """Start of the observations a city's output series need.
+
+    History for the averages and bands comes from the climatology cache.
+    The output series only need observations from the start of today (or
+    from the first forecast hour, if earlier, since observations replace
+    forecast rows at the same time).
+    """
+    since = pd.Timestamp(today.date()).tz_localize(tz_name)
+    if not forecast.empty:
+        since = min(since, forecast["time"].min())
+    return since
+
+
+def combine_city(city, tz_name, today=None, forecast=None, obs=None):
+    """Build one city's output JSON. `today`, `forecast` and `obs` are read
+    here unless given (see load_shared_inputs)."""
+    tz = pytz.timezone(tz_name)
+    if today is None:
+        today = datetime.now(tz)
+
+    if forecast is None:
+        with instrument.span("load_forecast", city=city):
+            forecast = load_forecast(city)
+    if obs is None:
+        since = observations_since(today, tz_name, forecast)
+        with instrument.span("load_observations", city=city):
+            obs = load_observations(city, tz, today, since=since)
+    with instrument.span("load_climatology", city=city):
+        clim = load_climatology(city, tz, today)
 
     if obs.empty and forecast.empty:
-        print(f"  No data for {city}")
+        print(f"  No recent data for {city}")
         return
 
     # Tag source for dedup priority (obs wins)
@@ -110,133 +489,186 @@ def combine_city(city, tz_name):
     # Convert to local timezone and format
     combined["time"] = combined["time"].dt.tz_convert(tz)
 
-    # Filter today-only data (for cloud_cover etc.)
+    # Build output: today-only data for cloud_cover etc., and historic
+    # entries stripped (today + future kept) for TODAY_FUTURE_VARS
     today_str = today.strftime("%Y-%m-%d")
-    today_only = combined[combined["time"].dt.strftime("%Y-%m-%d") == today_str]
-
-    # Build output
     all_vars = VARIABLES + FORECAST_ONLY_VARS
-    output = {}
-    for var in all_vars:
-        if var not in combined.columns:
-            continue
-        # Use today-only data for certain variables
-        source = today_only if var in TODAY_ONLY_VARS else combined
-        records = []
-        for _, row in source.iterrows():
-            val = row[var]
-            if pd.isna(val):
-                continue
-            records.append({
-                "time": row["time"].isoformat(),
-                "value": round(float(val), 1),
-            })
-        output[var] = records
-
-    # Compute hourly averages from historic observations only (exclude forecast)
-    if not obs.empty:
-        obs_local = obs.copy()
-        obs_local["time"] = pd.to_datetime(obs_local["time"], utc=True).dt.tz_convert(tz)
-        obs_local["hour"] = obs_local["time"].dt.hour
-
-        for var in BAND_VARS:
-            if var not in obs_local.columns:
-                continue
-            avg = obs_local.groupby("hour")[var].mean()
-            output[f"{var}_avg"] = [
-                {"hour": int(h), "value": round(float(v), 1)}
-                for h, v in avg.sort_index().items()
-                if not pd.isna(v)
-            ]
+    if OUTPUT_FORMAT == "compact":
+        series = build_series_compact(combined, all_vars, today_str)
+        output = {"format": "compact", "series": series, "averages": {}, "bands": {}}
+        # Compute hourly averages from historic observations only (exclude forecast)
+        if not clim.empty:
+            output.update(build_bands_compact(clim, BAND_VARS))
+        counts = {v: sum(x is not None for x in s["values"]) for v, s in series.items()}
+    else:
+        output = build_series(combined, all_vars, today_str)
+        if not clim.empty:
+            output.update(build_bands(clim, BAND_VARS))
+        counts = {v: len(output[v]) for v in all_vars if v in output}
 
-        # Compute quantile bands for BAND_VARS
-        for var in BAND_VARS:
-            if var not in obs_local.columns:
-                continue
-            avg_by_hour = obs_local.groupby("hour")[var].mean()
-
-            def _quantile(arr, q):
-                """Linear interpolation quantile matching the JS implementation."""
-                if len(arr) == 0:
-                    return float("nan")
-                pos = q * (len(arr) - 1)
-                lo = int(math.floor(pos))
-                hi = int(math.ceil(pos))
-                if lo == hi:
-                    return arr[lo]
-                return arr[lo] + (arr[hi] - arr[lo]) * (pos - lo)
-
-            boundaries = {}
-            for h in range(24):
-                avg_val = avg_by_hour.get(h)
-                if avg_val is None or pd.isna(avg_val):
-                    continue
-                vals = obs_local.loc[obs_local["hour"] == h, var].dropna().sort_values().tolist()
-                if not vals:
-                    continue
-                below = sorted([v for v in vals if v <= avg_val])
-                above = sorted([v for v in vals if v > avg_val])
-                boundaries[h] = [
-                    _quantile(below, 0),
-                    _quantile(below, 1 / 3),
-                    _quantile(below, 2 / 3),
-                    float(avg_val),
-                    _quantile(above, 1 / 3) if above else float(avg_val),
-                    _quantile(above, 2 / 3) if above else float(avg_val),
-                    _quantile(above, 1) if above else float(avg_val),
-                ]
-
-            bands = []
-            for b in range(6):
-                data = []
-                for h in range(24):
-                    if h not in boundaries:
-                        continue
-                    data.append({
-                        "hour": h,
-                        "lower": round(boundaries[h][b], 1),
-                        "upper": round(boundaries[h][b + 1], 1),
-                    })
-                bands.append(data)
-            output[f"{var}_bands"] = bands
-
-    # Strip historic entries — keep only today + future
-    for var in TODAY_FUTURE_VARS:
-        if var not in output:
-            continue
-        output[var] = [
-            entry for entry in output[var]
-            if entry["time"][:10] >= today_str
-        ]
-
-    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
     out_path = OUTPUT_DIR / f"{city}.json"
-    with open(out_path, "w") as f:
-        json.dump(output, f)
+    written = storage.write_text_if_changed(out_path, json.dumps(output))
+
+    print(f"  {city}: {counts} {'written to' if written else 'unchanged in'} {out_path}")
+
+
+# ─── Parallel combine ────────────────────────────────────────────────────────
+
+def _to_ipc(df):
+    """A DataFrame as an Arrow IPC stream (None for an empty frame)."""
+    if df.empty:
+        return None
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def _from_ipc(buffer):
+    if buffer is None:
+        return pd.DataFrame()
+    return pa.ipc.open_stream(buffer).read_all().to_pandas()
+
+
+def _fresh_rows(fetched, city, today):
+    """The rows of a city's just-fetched observations that load_observations
+    would return, i.e. those in this calendar month (archive months are
+    UTC months)."""
+    if fetched is None or fetched.empty:
+        return pd.DataFrame()
+    df = fetched[["time"] + [c for c in OBS_COLUMNS if c in fetched.columns]]
+    df = df.assign(city=city, time=pd.to_datetime(df["time"], utc=True))
+    return df[df["time"].dt.month == today.month].sort_values("time")
+
+
+def load_shared_inputs(city_timezones, forecasts=None, fetched=None):
+    """{city: (today, forecast, obs)} for every city, read once. `forecasts`
+    and `fetched` ({city: frame}) are used in place of what they cover."""
+    forecasts = forecasts or {}
+    fetched = fetched or {}
+    inputs = {}
+    by_month = {}
+    for city, tz_name in city_timezones.items():
+        today = datetime.now(pytz.timezone(tz_name))
+        if city in forecasts:
+            forecast = forecasts[city]
+        else:
+            with instrument.span("load_forecast", city=city):
+                forecast = load_forecast(city)
+        inputs[city] = (today, forecast, observations_since(today, tz_name, forecast),
+                        _fresh_rows(fetched.get(city), city, today))
+        by_month.setdefault(today.month, []).append(city)
+
+    shared = {}
+    for cities in by_month.values():
+        today = inputs[cities[0]][0]
+        since = min(inputs[city][2] for city in cities)
+        fresh_from = [inputs[city][3]["time"].min() for city in cities
+                      if not inputs[city][3].empty]
+        until = max(fresh_from) if len(fresh_from) == len(cities) else None
+        if until is None or until > since:
+            with instrument.span("load_observations", cities=len(cities)):
+                obs = load_recent_observations(cities, today, since, until)
+        else:
+            obs = pd.DataFrame()
+        for city in cities:
+            today, forecast, city_since, fresh = inputs[city]
+            parts = []
+            if not obs.empty:
+                rows = (obs["city"] == city) & (obs["time"] >= city_since)
+                if not fresh.empty:
+                    rows &= obs["time"] < fresh["time"].min()
+                parts.append(obs[rows])
+            if not fresh.empty:
+                parts.append(fresh[fresh["time"] >= city_since])
+            parts = [p for p in parts if not p.empty]
+            city_obs = (pd.concat(parts, ignore_index=True) if parts
+                        else pd.DataFrame())
+            shared[city] = (today, forecast, city_obs)
+    return shared
+
+
+def _combine_worker(city, tz_name, today, forecast_ipc, obs_ipc):
+    """Run combine_city in a pool process; returns its instrumentation."""
+    instrument.reset()
+    with instrument.span("combine_city", city=city):
+        combine_city(city, tz_name, today, _from_ipc(forecast_ipc), _from_ipc(obs_ipc))
+    return instrument.snapshot()
+
+
+def combine_cities(city_timezones, workers=COMBINE_WORKERS,
+                   forecasts=None, fetched=None):
+    """Combine every city in `city_timezones` ({city: tz name}); see
+    load_shared_inputs for `forecasts` and `fetched`."""
+    shared = load_shared_inputs(city_timezones, forecasts, fetched)
+    workers = min(workers, len(shared))
+    if workers <= 1:
+        for city, (today, forecast, obs) in shared.items():
+            with instrument.span("combine_city", city=city):
+                combine_city(city, city_timezones[city], today, forecast, obs)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(_combine_worker, city, city_timezones[city], today,
+                        _to_ipc(forecast), _to_ipc(obs))
+            for city, (today, forecast, obs) in shared.items()
+        ]
+        for future in futures:
+            instrument.merge(future.result())
+
+
+def write_bundle(cities):
+    """Write _bundle.json: the city list, a content hash per city file and
+    every city's payload, as written to OUTPUT_DIR. Cities without a file
+    are listed without a payload."""
+    hashes, payloads = {}, {}
+    for city in cities:
+        path = OUTPUT_DIR / f"{city}.json"
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            continue
+        instrument.file_read(path, len(data))
+        hashes[city] = hashlib.sha256(data).hexdigest()[:16]
+        payloads[city] = json.loads(data)
 
-    counts = {v: len(output.get(v, [])) for v in all_vars if v in output}
-    print(f"  {city}: {counts} written to {out_path}")
+    bundle = {"cities": cities, "hashes": hashes, "payloads": payloads}
+    bundle_path = OUTPUT_DIR / "_bundle.json"
+    written = storage.write_text_if_changed(bundle_path, json.dumps(bundle))
+    print(f"  Bundle: {len(payloads)} cities {'written to' if written else 'unchanged in'} {bundle_path}")
 
 
-def main():
-    city_timezones = load_city_timezones()
+def main(workers=COMBINE_WORKERS, city_timezones=None, forecasts=None, fetched=None):
+    """Combine CITIES. The scraper passes what it already holds (see
+    load_shared_inputs); anything not passed is read from disk."""
+    if city_timezones is None:
+        city_timezones = load_city_timezones()
 
-    built_cities = []
+    built = {}
     for city in CITIES:
         tz_name = city_timezones.get(city)
         if not tz_name:
             print(f"  Skipping {city}: no timezone in geocode cache")
             continue
-        combine_city(city, tz_name)
-        built_cities.append(city)
+        built[city] = tz_name
+    combine_cities(built, workers, forecasts, fetched)
+    built_cities = list(built)
 
     # Write city list for the frontend
-    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
     list_path = OUTPUT_DIR / "_list.json"
-    with open(list_path, "w") as f:
-        json.dump(built_cities, f)
+    storage.write_text_if_changed(list_path, json.dumps(built_cities))
     print(f"  City list: {built_cities} written to {list_path}")
+    write_bundle(built_cities)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Combine observations and forecasts per city.")
+    parser.add_argument(
+        "--workers", type=int, default=COMBINE_WORKERS,
+        help=f"processes combining cities in parallel (default: {COMBINE_WORKERS})",
+    )
+    args = parser.parse_args()
+    main(workers=args.workers)
+    instrument.write_report("combine")
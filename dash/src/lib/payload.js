@@ -0,0 +1,52 @@
+// Expands the compact city payloads written by combine.py (OUTPUT_FORMAT =
+// "compact") into the records the charts use:
+//
+//   series[var]   {start, step, values} -> [{time, value}]
+//   averages[var] 24 hourly means       -> {var}_avg   [{hour, value}]
+//   bands[var]    24 rows of 7 edges    -> {var}_bands 6 × [{hour, lower, upper}]
+//
+// Payloads already in the records format are returned unchanged.
+
+function decodeSeries({ start, step, values }) {
+    const points = [];
+    if (start === null) return points;
+    const t0 = Date.parse(start);
+    values.forEach((value, i) => {
+        if (value !== null) {
+            points.push({ time: new Date(t0 + i * step * 1000).toISOString(), value });
+        }
+    });
+    return points;
+}
+
+function decodeAverages(values) {
+    const points = [];
+    values.forEach((value, hour) => {
+        if (value !== null) points.push({ hour, value });
+    });
+    return points;
+}
+
+function decodeBands(rows) {
+    const bands = [[], [], [], [], [], []];
+    rows.forEach((row, hour) => {
+        if (row === null) return;
+        bands.forEach((band, b) => band.push({ hour, lower: row[b], upper: row[b + 1] }));
+    });
+    return bands;
+}
+
+export function decodeCity(payload) {
+    if (!payload || payload.format !== 'compact') return payload ?? {};
+    const data = {};
+    for (const [v, series] of Object.entries(payload.series)) {
+        data[v] = decodeSeries(series);
+    }
+    for (const [v, values] of Object.entries(payload.averages)) {
+        data[`${v}_avg`] = decodeAverages(values);
+    }
+    for (const [v, rows] of Object.entries(payload.bands)) {
+        data[`${v}_bands`] = decodeBands(rows);
+    }
+    return data;
+}
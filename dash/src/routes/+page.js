@@ -1,16 +1,27 @@
 export const prerender = true;
 
+// One request for every city (written by combine.py); falls back to the
+// city list and the per-city files, fetched concurrently
+async function loadCities(fetch) {
+    const bundleRes = await fetch('/cities/_bundle.json');
+    if (bundleRes.ok) {
+        const bundle = await bundleRes.json();
+        return { cities: bundle.cities, cityData: bundle.payloads };
+    }
+
+    const listRes = await fetch('/cities/_list.json');
+    const cities = await listRes.json();
+    const payloads = await Promise.all(
+        cities.map(city => fetch(`/cities/${city}.json`).then(res => res.json()))
+    );
+    const cityData = Object.fromEntries(cities.map((city, i) => [city, payloads[i]]));
+    return { cities, cityData };
+}
+
 export async function load({ fetch }) {
     try {
 
-        const listRes = await fetch('/cities/_list.json');
-        const cities = await listRes.json();
-
-        const cityData = {};
-        for (const city of cities) {
-            const res = await fetch(`/cities/${city}.json`);
-            cityData[city] = await res.json();
-        }
+        const { cities, cityData } = await loadCities(fetch);
 
         const now = new Date();
         const today = new Intl.DateTimeFormat('en-CA', {
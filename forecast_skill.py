@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Forecast skill: how far Open-Meteo's forecasts were from what happened.
+
+Joins every forecast vintage (see vintages.py) to the observation archive
+on (city, valid time) and accumulates, per city, variable and lead-time
+bucket, the sufficient statistics for MAE, RMSE and bias (count, sum of
+errors, absolute errors and squared errors). The statistics and the last
+verified hour per city are kept in STATE_PATH, so each run only reads the
+vintages and observations for hours verified since the previous run.
+Errors are forecast minus observed.
+
+Writes dash/static/forecast_skill.json for the dashboard:
+
+    {"verified_through": ..., "lead_buckets": ["0-6h", ...],
+     "cities": {"Sydney": {"temperature_2m": {"n": [...], "mae": [...],
+                                              "rmse": [...], "bias": [...]}}}}
+
+    python forecast_skill.py [--rebuild]
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import archive
+import instrument
+import storage
+import vintages
+
+BASE_DIR = Path(__file__).parent
+ARCHIVE_DIR = BASE_DIR / "new_data" / "observations" / "archive"
+VINTAGE_DIR = BASE_DIR / "new_data" / "forecasts" / "vintages"
+STATE_PATH = BASE_DIR / "new_data" / "forecast_skill_state.json"
+OUTPUT_PATH = BASE_DIR / "dash" / "static" / "forecast_skill.json"
+
+SKILL_VARS = [
+    "temperature_2m", "relative_humidity_2m", "precipitation",
+    "cloud_cover", "wind_speed_10m",
+]
+
+# Lead-time bucket edges in hours; bucket i holds leads in [edge i, edge i+1)
+LEAD_EDGES = [0, 6, 12, 24, 48, 72, 120, 168, 240, 384]
+LEAD_BUCKETS = [f"{lo}-{hi}h" for lo, hi in zip(LEAD_EDGES, LEAD_EDGES[1:])]
+
+STAT_COLS = ["n", "sum_error", "sum_abs_error", "sum_sq_error"]
+
+# Valid-time span verified per read, bounding memory on long backfills
+WINDOW = pd.Timedelta(days=31)
+
+
+# ─── State ───────────────────────────────────────────────────────────────────
+
+def _empty_stats() -> pd.DataFrame:
+    index = pd.MultiIndex.from_tuples([], names=["city", "variable", "bucket"])
+    return pd.DataFrame(columns=STAT_COLS, index=index, dtype="float64")
+
+
+def load_state() -> tuple:
+    """(through, stats): last verified hour per city, and the accumulated
+    statistics indexed by (city, variable, bucket)."""
+    if not STATE_PATH.exists():
+        return {}, _empty_stats()
+    with open(STATE_PATH) as f:
+        state = json.load(f)
+    through = {city: pd.Timestamp(t) for city, t in state["through"].items()}
+    stats = pd.DataFrame(state["stats"])
+    if stats.empty:
+        return through, _empty_stats()
+    return through, stats.set_index(["city", "variable", "bucket"]).astype("float64")
+
+
+def save_state(through: dict, stats: pd.DataFrame):
+    state = {
+        "through": {city: t.isoformat() for city, t in sorted(through.items())},
+        "stats": stats.reset_index().to_dict(orient="records"),
+    }
+    storage.write_text_if_changed(STATE_PATH, json.dumps(state))
+
+
+# ─── Verification ────────────────────────────────────────────────────────────
+
+def window_stats(forecast: pd.DataFrame, obs: pd.DataFrame, variables: list) -> pd.DataFrame:
+    """Statistics for one batch of vintages against observations, indexed by
+    (variable, bucket). Pairs with either side missing are skipped."""
+    joined = forecast.merge(obs[["time"] + variables], on="time", suffixes=("", "_obs"))
+    if joined.empty:
+        return pd.DataFrame(columns=STAT_COLS)
+
+    errors = pd.DataFrame(
+        joined[variables].to_numpy("float64")
+        - joined[[f"{v}_obs" for v in variables]].to_numpy("float64"),
+        columns=variables,
+    )
+    errors["bucket"] = np.searchsorted(LEAD_EDGES, joined["lead_hours"], side="right") - 1
+    errors = errors[errors["bucket"] < len(LEAD_BUCKETS)]
+
+    long = errors.melt(id_vars="bucket", var_name="variable", value_name="error").dropna()
+    long["abs_error"] = long["error"].abs()
+    long["sq_error"] = long["error"] ** 2
+    return long.groupby(["variable", "bucket"]).agg(
+        n=("error", "size"),
+        sum_error=("error", "sum"),
+        sum_abs_error=("abs_error", "sum"),
+        sum_sq_error=("sq_error", "sum"),
+    ).astype("float64")
+
+
+def verify_city(city: str, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+    """Statistics for every vintage of `city` valid in [start, end)."""
+    totals = []
+    for lo in pd.date_range(start, end, freq=WINDOW, inclusive="left"):
+        hi = min(lo + WINDOW, end)
+        forecast = vintages.read(
+            VINTAGE_DIR, city, valid_since=lo, valid_until=hi, columns=SKILL_VARS,
+            where=[("lead_hours", ">=", 0)],
+        )
+        if forecast.empty:
+            continue
+        obs = (
+            archive.view(ARCHIVE_DIR, ["city", "time"])
+            .filter(city=city, since=lo, until=hi)
+            .select(SKILL_VARS)
+            .to_pandas()
+        )
+        if obs.empty:
+            continue
+        variables = [v for v in SKILL_VARS if v in forecast.columns and v in obs.columns]
+        totals.append(window_stats(forecast, obs, variables))
+    if not totals:
+        return pd.DataFrame(columns=STAT_COLS)
+    return pd.concat(totals).groupby(level=["variable", "bucket"]).sum()
+
+
+def update(cities: list, through: dict, stats: pd.DataFrame) -> tuple:
+    """Verify each city's hours since `through`, up to its newest observation."""
+    for city in cities:
+        obs_range = archive.city_time_range(ARCHIVE_DIR, city)
+        vintage_range = archive.city_time_range(VINTAGE_DIR, city)
+        if obs_range is None or vintage_range is None:
+            continue
+        start = through.get(city, vintage_range[0] - pd.Timedelta(hours=1)) + pd.Timedelta(hours=1)
+        end = obs_range[1] + pd.Timedelta(hours=1)
+        if start >= end:
+            continue
+
+        with instrument.span("verify_forecasts", city=city):
+            new = verify_city(city, start, end)
+        if not new.empty:
+            new = pd.concat({city: new}, names=["city"])
+            stats = pd.concat([stats, new]).groupby(level=["city", "variable", "bucket"]).sum()
+        # Vintages are only verified at non-negative leads, and every
+        # later issue is valid after the observations end, so nothing
+        # at or before `end` can still arrive.
+        through[city] = end - pd.Timedelta(hours=1)
+        print(f"  {city}: verified {start:%Y-%m-%d %H:%M} → {through[city]:%Y-%m-%d %H:%M}")
+    return through, stats
+
+
+# ─── Output ──────────────────────────────────────────────────────────────────
+
+def skill_table(stats: pd.DataFrame) -> dict:
+    """MAE/RMSE/bias per city, variable and bucket (None where no pairs)."""
+    cities = {}
+    for (city, variable), group in stats.groupby(level=["city", "variable"]):
+        group = group.droplevel(["city", "variable"]).reindex(range(len(LEAD_BUCKETS)))
+        n = group["n"].fillna(0)
+        safe_n = n.where(n > 0)
+
+        def values(series, digits=2):
+            return [None if pd.isna(v) else round(float(v), digits) for v in series]
+
+        cities.setdefault(city, {})[variable] = {
+            "n": [int(v) for v in n],
+            "mae": values(group["sum_abs_error"] / safe_n),
+            "rmse": values(np.sqrt(group["sum_sq_error"] / safe_n)),
+            "bias": values(group["sum_error"] / safe_n),
+        }
+    return cities
+
+
+def main(rebuild: bool = False):
+    from open_meteo_scraper import CITIES
+
+    through, stats = ({}, _empty_stats()) if rebuild else load_state()
+    through, stats = update(CITIES, through, stats)
+    save_state(through, stats)
+
+    # Stamped with the newest verified hour rather than the wall clock, so
+    # the file only changes when new hours have been verified
+    output = {
+        "verified_through": max(through.values()).isoformat() if through else None,
+        "lead_buckets": LEAD_BUCKETS,
+        "cities": skill_table(stats),
+    }
+    if storage.write_text_if_changed(OUTPUT_PATH, json.dumps(output)):
+        print(f"  Forecast skill: {len(output['cities'])} cities written to {OUTPUT_PATH}")
+    else:
+        print("  Forecast skill: unchanged")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update forecast skill statistics.")
+    parser.add_argument(
+        "--rebuild", action="store_true",
+        help="discard the saved statistics and verify every vintage again",
+    )
+    args = parser.parse_args()
+    main(rebuild=args.rebuild)
+    instrument.write_report("forecast_skill")
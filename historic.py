@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Pre-aggregated historic Melbourne rainfall and maximum temperature.
+
+Reads the daily series since 1855 (data/melbs/{rain,temp}.csv, as written
+by grab_melbs) and writes what the dashboard plots, rather than every
+daily record, under dash/static/historic/:
+
+    index.json                 per kind: unit, date range, daily tile list
+    {kind}/summary.json        day-of-year percentiles, yearly totals
+                               (rain) or means (temp), decade means
+    {kind}/monthly.json        monthly totals / means
+    {kind}/daily/{decade}.json daily values, one tile per decade
+
+so a chart downloads a few kilobytes and only fetches the level of detail
+it zooms to. Series are {"start", "step", "values"} like the compact city
+payloads, with "step" a calendar unit ("day", "month" or "year") and null
+for missing values. For rain the day-of-year percentiles are of the
+year-to-date total, for temperature of the day's maximum.
+
+    python historic.py
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import instrument
+import storage
+
+BASE_DIR = Path(__file__).parent
+SOURCE_DIR = BASE_DIR / "data" / "melbs"
+OUTPUT_DIR = BASE_DIR / "dash" / "static" / "historic"
+
+# kind: how days aggregate to months, years and decades, and the unit
+KINDS = {
+    "rain": {"how": "sum", "unit": "mm"},
+    "temp": {"how": "mean", "unit": "°C"},
+}
+PERCENTILES = [10, 25, 50, 75, 90]
+# Years with fewer observed days are left out of decade means and the
+# day-of-year percentiles (a partial year's rain total is not comparable)
+COMPLETE_YEAR_DAYS = 350
+
+
+def load_daily(kind: str) -> pd.Series:
+    """Daily values indexed by date, every day from the first to the last
+    present (NaN where missing)."""
+    path = SOURCE_DIR / f"{kind}.csv"
+    df = pd.read_csv(path, parse_dates=["Date"])
+    instrument.file_read(path)
+    series = df.set_index("Date")["Value"].astype("float64")
+    series = series[~series.index.duplicated(keep="first")].sort_index()
+    return series.asfreq("D")
+
+
+def _rounded(values) -> list:
+    values = np.round(np.asarray(values, dtype="float64"), 1)
+    return [None if np.isnan(v) else float(v) for v in values]
+
+
+def _series(start: str, step: str, values) -> dict:
+    return {"start": start, "step": step, "values": _rounded(values)}
+
+
+def _day_of_year(index: pd.DatetimeIndex) -> np.ndarray:
+    """1-366 on a leap-year calendar, so 1 March is always day 61."""
+    doy = index.dayofyear.to_numpy()
+    return doy + ((~index.is_leap_year) & (index.month > 2)).astype(int)
+
+
+# ─── Aggregates ──────────────────────────────────────────────────────────────
+
+def yearly(daily: pd.Series, how: str) -> pd.DataFrame:
+    """Per year: the total or mean, and the number of observed days."""
+    grouped = daily.groupby(daily.index.year)
+    return pd.DataFrame({"value": grouped.agg(how), "days": grouped.count()})
+
+
+def decades(years: pd.DataFrame) -> pd.DataFrame:
+    """Mean of the complete years' values per decade."""
+    complete = years[years["days"] >= COMPLETE_YEAR_DAYS]
+    grouped = complete["value"].groupby(complete.index // 10 * 10)
+    return pd.DataFrame({"mean": grouped.mean(), "years": grouped.count()})
+
+
+def day_of_year_percentiles(daily: pd.Series, how: str, years: pd.DataFrame) -> dict:
+    """PERCENTILES, mean and count per day of year over complete years."""
+    complete = years.index[years["days"] >= COMPLETE_YEAR_DAYS]
+    daily = daily[daily.index.year.isin(complete)]
+    if how == "sum":
+        daily = daily.fillna(0).groupby(daily.index.year).cumsum()
+    table = pd.DataFrame({"doy": _day_of_year(daily.index), "value": daily.to_numpy()})
+    grouped = table.dropna().groupby("doy")["value"]
+    doy = pd.RangeIndex(1, 367)
+    out = {f"p{p}": _rounded(grouped.quantile(p / 100).reindex(doy)) for p in PERCENTILES}
+    out["mean"] = _rounded(grouped.mean().reindex(doy))
+    out["n"] = [int(n) for n in grouped.count().reindex(doy, fill_value=0)]
+    return out
+
+
+def build(kind: str) -> dict:
+    """Write every file for one kind; returns its index.json entry."""
+    how = KINDS[kind]["how"]
+    daily = load_daily(kind)
+    kind_dir = OUTPUT_DIR / kind
+    years = yearly(daily, how)
+    decade_means = decades(years)
+
+    summary = {
+        "years": {
+            **_series(str(years.index[0]), "year", years["value"]),
+            "days": [int(d) for d in years["days"]],
+        },
+        "decades": {
+            "decade": [int(d) for d in decade_means.index],
+            "mean": _rounded(decade_means["mean"]),
+            "years": [int(n) for n in decade_means["years"]],
+        },
+        "day_of_year": {
+            "cumulative": how == "sum",
+            "percentiles": PERCENTILES,
+            **day_of_year_percentiles(daily, how, years),
+        },
+    }
+    written = storage.write_text_if_changed(kind_dir / "summary.json", json.dumps(summary))
+
+    monthly = daily.resample("MS").agg(how).where(daily.resample("MS").count() > 0)
+    written += storage.write_text_if_changed(
+        kind_dir / "monthly.json",
+        json.dumps(_series(monthly.index[0].strftime("%Y-%m"), "month", monthly)),
+    )
+
+    tiles = []
+    for decade, values in daily.groupby(daily.index.year // 10 * 10):
+        tiles.append(int(decade))
+        written += storage.write_text_if_changed(
+            kind_dir / "daily" / f"{decade}.json",
+            json.dumps(_series(values.index[0].strftime("%Y-%m-%d"), "day", values)),
+        )
+    print(f"  {kind}: {daily.count()} days → {len(tiles)} daily tiles, "
+          f"{written} files written")
+
+    observed = daily.dropna().index
+    return {
+        "unit": KINDS[kind]["unit"],
+        "first": observed[0].strftime("%Y-%m-%d"),
+        "last": observed[-1].strftime("%Y-%m-%d"),
+        "daily_tiles": tiles,
+    }
+
+
+def main():
+    index = {kind: build(kind) for kind in KINDS}
+    storage.write_text_if_changed(OUTPUT_DIR / "index.json", json.dumps(index))
+
+
+if __name__ == "__main__":
+    main()
+    instrument.write_report("historic")
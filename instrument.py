@@ -0,0 +1,210 @@
+"""
+Run instrumentation for the scraper and combine.
+
+Stages and per-city work are wrapped in `span()`; `count()` accumulates
+run-wide counters (HTTP requests, requests_cache hits/misses, rate-limit
+wait) and `file_read()` / `file_written()` record bytes per file
+(CountingFile records what a parquet read actually touched).
+`write_report()` writes every event of the run as JSON lines to
+REPORT_DIR/latest.jsonl and appends a one-line summary to
+REPORT_DIR/runs.jsonl, so runs can be trended over time. REPORT_DIR is
+git-ignored (a report changes every run, so committing it would turn
+every no-op run into a commit); the hourly workflow uploads it as the
+run's "run-report" artifact instead:
+
+    {"type": "span", "name": "fetch_observations", "city": "Sydney", "start": 0.41, "seconds": 3.2, ...}
+    {"type": "file", "op": "write", "path": "new_data/...parquet", "bytes": 48211}
+    {"type": "run", "name": "scrape", "seconds": 41.7, "counters": {...}, "stages": {...}, ...}
+
+All functions are thread-safe; recording is always on and cheap.
+"""
+
+import io
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+REPORT_DIR = BASE_DIR / "new_data" / "reports"
+
+_lock = threading.Lock()
+_events = []
+_counters = {}
+_started = time.perf_counter()
+_started_at = datetime.now(timezone.utc)
+
+
+def reset():
+    """Start a new run: drop recorded events and counters."""
+    global _started, _started_at
+    with _lock:
+        _events.clear()
+        _counters.clear()
+        _started = time.perf_counter()
+        _started_at = datetime.now(timezone.utc)
+
+
+def _record(event: dict):
+    with _lock:
+        _events.append(event)
+
+
+def count(name: str, n: float = 1):
+    """Add `n` to a run-wide counter."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a block as a named span; `attrs` (e.g. city=...) go into the event."""
+    began = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record({
+            "type": "span",
+            "name": name,
+            **attrs,
+            "start": round(began - _started, 4),
+            "seconds": round(time.perf_counter() - began, 4),
+            "thread": threading.current_thread().name,
+        })
+
+
+def _relative(path) -> str:
+    try:
+        return str(Path(path).resolve().relative_to(BASE_DIR))
+    except ValueError:
+        return str(path)
+
+
+def _file_event(op: str, path, n_bytes: int | None):
+    if n_bytes is None:
+        try:
+            n_bytes = os.path.getsize(path)
+        except OSError:
+            return
+    suffix = "read" if op == "read" else "written"
+    count(f"bytes_{suffix}", n_bytes)
+    count(f"files_{suffix}")
+    _record({"type": "file", "op": op, "path": _relative(path), "bytes": n_bytes})
+
+
+def file_read(path, n_bytes: int | None = None):
+    """Record a file read (size on disk unless `n_bytes` is given)."""
+    _file_event("read", path, n_bytes)
+
+
+def file_written(path, n_bytes: int | None = None):
+    """Record a file write (size on disk unless `n_bytes` is given)."""
+    _file_event("write", path, n_bytes)
+
+
+class CountingFile(io.FileIO):
+    """Read-only binary file that records the bytes actually read on close.
+
+    Pass it to pyarrow instead of a path to see how much of a file a
+    filtered, projected read really touches.
+    """
+
+    def __init__(self, path):
+        super().__init__(path, "rb")
+        self.bytes_read = 0
+
+    def readinto(self, buffer):
+        n = super().readinto(buffer)
+        self.bytes_read += n or 0
+        return n
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def close(self):
+        if not self.closed:
+            file_read(self.name, self.bytes_read)
+        super().close()
+
+
+def http_response_hook(response, *args, **kwargs):
+    """requests/requests_cache response hook counting HTTP traffic.
+
+    Install with `session.hooks["response"].append(http_response_hook)`;
+    requests_cache dispatches hooks for cached responses too, with
+    `response.from_cache` set, and a second time for responses it has
+    just fetched, so each response is only counted once.
+    """
+    if getattr(response, "_instrumented", False):
+        return response
+    response._instrumented = True
+    count("http_requests")
+    count("cache_hits" if getattr(response, "from_cache", False) else "cache_misses")
+    count("http_bytes", len(response.content or b""))
+    return response
+
+
+def snapshot() -> dict:
+    """This process's events and counters, for merge() in another process
+    (e.g. returned from a process-pool worker that called reset())."""
+    with _lock:
+        return {"started": _started, "events": list(_events), "counters": dict(_counters)}
+
+
+def merge(snap: dict):
+    """Add a snapshot() taken in another process to this run.
+
+    Span starts are shifted onto this run's clock (perf_counter is
+    system-wide on the platforms the scraper runs on).
+    """
+    offset = snap["started"] - _started
+    with _lock:
+        for event in snap["events"]:
+            if event["type"] == "span":
+                event = dict(event, start=round(event["start"] + offset, 4))
+            _events.append(event)
+        for name, n in snap["counters"].items():
+            _counters[name] = _counters.get(name, 0) + n
+
+
+def summary(name: str) -> dict:
+    """Run-level totals: counters plus seconds per span name."""
+    with _lock:
+        stages = {}
+        for event in _events:
+            if event["type"] == "span":
+                stage = stages.setdefault(event["name"], {"count": 0, "seconds": 0.0})
+                stage["count"] += 1
+                stage["seconds"] = round(stage["seconds"] + event["seconds"], 4)
+        return {
+            "type": "run",
+            "name": name,
+            "started_at": _started_at.isoformat(timespec="seconds"),
+            "seconds": round(time.perf_counter() - _started, 3),
+            "counters": {k: round(v, 3) for k, v in sorted(_counters.items())},
+            "stages": stages,
+        }
+
+
+def write_report(name: str, report_dir: Path | None = None) -> dict:
+    """Write this run's events and summary; returns the summary."""
+    report_dir = report_dir or REPORT_DIR
+    report_dir.mkdir(parents=True, exist_ok=True)
+    run = summary(name)
+    with _lock:
+        events = list(_events)
+    # Replaced whole (not rewritten in place) so a killed run cannot leave
+    # half a report; runs.jsonl is append-only
+    tmp = report_dir / ".latest.jsonl.tmp"
+    with open(tmp, "w") as f:
+        for event in events + [run]:
+            f.write(json.dumps(event) + "\n")
+    os.replace(tmp, report_dir / "latest.jsonl")
+    with open(report_dir / "runs.jsonl", "a") as f:
+        f.write(json.dumps(run) + "\n")
+    return run
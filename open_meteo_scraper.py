@@ -4,18 +4,30 @@ Open Meteo Weather Scraper
 
 Standalone scraper that collects historical observations and forecasts
 for Australian cities using the Open Meteo API. Stores data as JSON
-(latest) and monthly Parquet (archive).
+(latest) and monthly Parquet (archive, see archive.py).
 """
 
+import argparse
 import json
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
 import openmeteo_requests
 import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
 import requests_cache
-from retry_requests import retry
+from requests.adapters import HTTPAdapter
+from urllib3 import Retry
+from urllib3.util.request import ACCEPT_ENCODING
+
+import archive
+import instrument
+import storage
+import vintages
 
 # ─── Configuration ───────────────────────────────────────────────────────────
 
@@ -52,34 +64,190 @@ DAILY_VARS = [
 
 BASE_DIR = Path(__file__).resolve().parent / "new_data"
 GEOCODE_CACHE_PATH = BASE_DIR / "geocode_cache.json"
+BACKFILL_CURSOR_PATH = BASE_DIR / "backfill_cursor.json"
 OBS_DIR = BASE_DIR / "observations"
 OBS_ARCHIVE_DIR = OBS_DIR / "archive"
 FORECAST_DIR = BASE_DIR / "forecasts"
 FORECAST_ARCHIVE_DIR = FORECAST_DIR / "archive"
+FORECAST_VINTAGE_DIR = FORECAST_DIR / "vintages"
 
-# Archive API chunk size (days) to stay within API limits
+# Archive API chunk size (days): the starting window, and the bounds the
+# adaptive sizing in iter_observations_batch may move it between
 CHUNK_DAYS = 90
+CHUNK_MIN_DAYS = 7
+CHUNK_MAX_DAYS = 730
+
+# Largest request (in weighted API calls, see request_weight) we will send
+MAX_REQUEST_WEIGHT = 60.0
+
+# Archive responses faster than this (seconds) grow the next window
+FAST_RESPONSE_SECONDS = 5.0
+
+# Shared token bucket for all API workers, in weighted API calls (see
+# request_weight): sustained calls per second (Open-Meteo allows 600 per
+# minute), and how many may be spent back-to-back before callers wait
+RATE_LIMIT_PER_SECOND = 10.0
+RATE_LIMIT_BURST = 60
 
-# Delay between city requests (seconds) to respect rate limits
-REQUEST_DELAY = 1.0
+# Worker threads used to fetch city batches concurrently (1 = sequential)
+MAX_WORKERS = 8
+
+# Cities requested together in one multi-location API call
+BATCH_SIZE = 4
+
+# Shared HTTP session (see setup_session): keep-alive connections are pooled
+# per API host (geocoding, archive, forecast), one per worker thread
+API_HOSTS = 3
+HTTP_RETRIES = 5
+HTTP_BACKOFF_FACTOR = 0.2
+HTTP_RETRY_STATUSES = (500, 502, 504)
+HTTP_CACHE_SECONDS = 3600
+GEOCODE_TIMEOUT = 30
+
+# Negotiate HTTP/2 through niquests (already installed with
+# openmeteo_requests). Off by default: that session has no response cache.
+HTTP2 = False
 
 # ─── Setup ───────────────────────────────────────────────────────────────────
 
-def setup_client():
-    """Create an Open Meteo API client with caching and retry."""
-    cache_session = requests_cache.CachedSession(
-        ".openmeteo_cache", expire_after=3600
-    )
-    retry_session = retry(cache_session, retries=5, backoff_factor=0.2)
-    return openmeteo_requests.Client(session=retry_session)
+class RateLimiter:
+    """Thread-safe token bucket shared by every worker making API calls.
+
+    Tokens refill continuously at `rate` per second up to `burst`. A caller
+    that finds the bucket empty sleeps only as long as it takes for the next
+    token to arrive, so concurrent workers together never exceed the budget.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        """Block until `tokens` are available, then consume them."""
+        # A request heavier than the whole bucket waits for a full bucket
+        tokens = min(tokens, self.burst)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    elapsed = now - self._updated
+                    self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+                    self._updated = now
+                    if self._tokens >= tokens:
+                        self._tokens -= tokens
+                        if waited:
+                            instrument.count("rate_limit_wait_seconds", waited)
+                        return
+                    wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def pause(self, seconds: float):
+        """Stop all workers for `seconds` (e.g. after the API reports a rate limit)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+            self._updated = self._paused_until
+
+
+def setup_limiter() -> RateLimiter:
+    return RateLimiter(RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST)
+
+
+def setup_session(max_workers: int = MAX_WORKERS, http2: bool = HTTP2):
+    """One HTTP session for every Open-Meteo call, shared by all workers.
+
+    Connections stay open between requests and are pooled per host, with
+    room for one per worker thread so none is opened and dropped under
+    load; failed requests retry with backoff, and responses are requested
+    compressed (gzip/deflate, plus br and zstd when brotli / zstandard are
+    installed). Both session types below are safe to share across threads.
+
+    Over HTTP/1.1 this is a requests_cache CachedSession. With `http2` it is
+    a niquests session, which negotiates HTTP/2 per host (falling back to
+    HTTP/1.1) but does not cache responses.
+    """
+    pool = {"pool_connections": API_HOSTS, "pool_maxsize": max(1, max_workers)}
+    retry = {
+        "total": HTTP_RETRIES, "read": HTTP_RETRIES, "connect": HTTP_RETRIES,
+        "backoff_factor": HTTP_BACKOFF_FACTOR,
+        "status_forcelist": HTTP_RETRY_STATUSES,
+        "allowed_methods": None,
+    }
+    if http2:
+        import niquests
+        from niquests.packages.urllib3 import Retry as H2Retry
+        session = niquests.Session(retries=H2Retry(**retry), **pool)
+    else:
+        session = requests_cache.CachedSession(
+            ".openmeteo_cache", expire_after=HTTP_CACHE_SECONDS
+        )
+        adapter = HTTPAdapter(max_retries=Retry(**retry), **pool)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+    session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+    session.hooks["response"].append(instrument.http_response_hook)
+    return session
+
+
+def setup_client(session=None):
+    """Create an Open Meteo API client on a shared session (see setup_session)."""
+    return openmeteo_requests.Client(session=session or setup_session())
 
 
 def ensure_dirs():
     """Create all required directories."""
-    for d in [OBS_DIR, OBS_ARCHIVE_DIR, FORECAST_DIR, FORECAST_ARCHIVE_DIR]:
+    for d in [OBS_DIR, OBS_ARCHIVE_DIR, FORECAST_DIR, FORECAST_VINTAGE_DIR]:
         d.mkdir(parents=True, exist_ok=True)
 
 
+def archive_dirs() -> list:
+    """Every parquet archive with its dedup columns, as (dir, dedup_cols)."""
+    return [
+        (OBS_ARCHIVE_DIR, ["city", "time"]),
+        (FORECAST_ARCHIVE_DIR, ["city", "time"]),
+        (FORECAST_VINTAGE_DIR, vintages.DEDUP_COLS),
+    ]
+
+
+# ─── Backfill Cursor ─────────────────────────────────────────────────────────
+
+# Next date to fetch for each city whose observation fetch has not finished.
+# Written after every archived chunk, so an interrupted backfill resumes
+# where it stopped instead of from HISTORY_START_DATE.
+
+_cursor_lock = threading.Lock()
+
+
+def load_backfill_cursor() -> dict:
+    if BACKFILL_CURSOR_PATH.exists():
+        with open(BACKFILL_CURSOR_PATH) as f:
+            return json.load(f)
+    return {}
+
+
+def save_backfill_cursor(cursor: dict):
+    storage.write_json(BACKFILL_CURSOR_PATH, cursor, indent=2, sort_keys=True)
+
+
+def update_backfill_cursor(cursor: dict, cities: list, next_start: str | None):
+    """Record `next_start` for `cities`, or clear them when it is None."""
+    with _cursor_lock:
+        for city in cities:
+            if next_start is None:
+                cursor.pop(city, None)
+            else:
+                cursor[city] = next_start
+        save_backfill_cursor(cursor)
+
+
 # ─── Geocoding ───────────────────────────────────────────────────────────────
 
 def load_geocode_cache() -> dict:
@@ -90,17 +258,15 @@ def load_geocode_cache() -> dict:
 
 
 def save_geocode_cache(cache: dict):
-    with open(GEOCODE_CACHE_PATH, "w") as f:
-        json.dump(cache, f, indent=2)
+    storage.write_json(GEOCODE_CACHE_PATH, cache, indent=2)
 
 
-def geocode_city(city_name: str) -> dict:
+def geocode_city(city_name: str, session=None) -> dict:
     """Look up a city using the Open Meteo Geocoding API."""
-    import requests
-
+    session = session or setup_session()
     url = "https://geocoding-api.open-meteo.com/v1/search"
     params = {"name": city_name, "count": 1, "language": "en", "format": "json"}
-    resp = requests.get(url, params=params, timeout=30)
+    resp = session.get(url, params=params, timeout=GEOCODE_TIMEOUT)
     resp.raise_for_status()
     data = resp.json()
 
@@ -117,7 +283,8 @@ def geocode_city(city_name: str) -> dict:
     }
 
 
-def geocode_all_cities(cities: list) -> dict:
+def geocode_all_cities(cities: list, limiter: RateLimiter | None = None,
+                       session=None) -> dict:
     """Geocode all cities, using cache where available."""
     cache = load_geocode_cache()
     updated = False
@@ -127,9 +294,10 @@ def geocode_all_cities(cities: list) -> dict:
             print(f"  Geocode cache hit: {city}")
             continue
         print(f"  Geocoding: {city}...")
-        cache[city] = geocode_city(city)
+        if limiter:
+            limiter.acquire()
+        cache[city] = geocode_city(city, session)
         updated = True
-        time.sleep(0.5)
 
     if updated:
         save_geocode_cache(cache)
@@ -139,275 +307,553 @@ def geocode_all_cities(cities: list) -> dict:
 
 # ─── Data Fetching ───────────────────────────────────────────────────────────
 
-def api_call_with_rate_limit(client, url, params, max_retries=5):
-    """Make an API call with rate-limit retry logic."""
+class RateLimitError(RuntimeError):
+    """The API kept rejecting a request because of rate limits."""
+
+
+def request_weight(n_days: float, n_vars: int, n_locations: int = 1) -> float:
+    """How many API calls Open-Meteo counts a request as.
+
+    Requests with more than 10 variables or more than 2 weeks of data per
+    location are counted as proportionally more calls.
+    """
+    return max(1.0, n_vars / 10) * max(1.0, n_days / 14) * n_locations
+
+
+def api_call_with_rate_limit(client, url, params, max_retries=5,
+                             limiter: RateLimiter | None = None,
+                             weight: float = 1.0):
+    """Make an API call with rate-limit retry logic.
+
+    When a shared `limiter` is given, each attempt first takes `weight`
+    tokens from it, and a rate-limit response pauses the limiter so every
+    worker backs off together instead of each hammering the API on its own
+    schedule.
+    """
     from openmeteo_requests.Client import OpenMeteoRequestsError
 
     for attempt in range(max_retries):
+        if limiter:
+            limiter.acquire(weight)
+        instrument.count("api_calls")
         try:
             return client.weather_api(url, params=params)
         except OpenMeteoRequestsError as e:
             if "rate limit" in str(e).lower() or "limit exceeded" in str(e).lower():
                 wait = 60 * (attempt + 1)
                 print(f"    Rate limited, waiting {wait}s (attempt {attempt + 1}/{max_retries})...")
-                time.sleep(wait)
+                instrument.count("rate_limited")
+                if limiter:
+                    limiter.pause(wait)
+                else:
+                    time.sleep(wait)
+                    instrument.count("rate_limit_wait_seconds", wait)
             else:
                 raise
-    raise RuntimeError(f"Rate limit exceeded after {max_retries} retries")
+    raise RateLimitError(f"Rate limit exceeded after {max_retries} retries")
 
 
-def fetch_observations(client, lat: float, lon: float,
-                       start_date: str, end_date: str) -> pd.DataFrame:
-    """Fetch historical observations from the Archive API in chunks."""
-    all_frames = []
-    start = datetime.strptime(start_date, "%Y-%m-%d")
-    end = datetime.strptime(end_date, "%Y-%m-%d")
+def _block_to_frame(block, variables: list) -> pd.DataFrame:
+    """Decode one hourly/daily block of a WeatherApiResponse into a DataFrame."""
+    data = {
+        "time": pd.date_range(
+            start=pd.to_datetime(block.Time(), unit="s", utc=True),
+            end=pd.to_datetime(block.TimeEnd(), unit="s", utc=True),
+            freq=pd.Timedelta(seconds=block.Interval()),
+            inclusive="left",
+        )
+    }
+    for i, var in enumerate(variables):
+        data[var] = block.Variables(i).ValuesAsNumpy()
+    return pd.DataFrame(data)
 
-    while start <= end:
-        chunk_end = min(start + timedelta(days=CHUNK_DAYS - 1), end)
-        s_str = start.strftime("%Y-%m-%d")
-        e_str = chunk_end.strftime("%Y-%m-%d")
-        print(f"    Archive: {s_str} → {e_str}")
 
-        responses = api_call_with_rate_limit(
-            client,
-            "https://archive-api.open-meteo.com/v1/archive",
-            params={
-                "latitude": lat,
-                "longitude": lon,
-                "start_date": s_str,
-                "end_date": e_str,
-                "hourly": HOURLY_VARS,
-                "timezone": "UTC",
-            },
+def _batch_params(coords: list) -> dict:
+    """Comma-separated coordinate lists for a multi-location request."""
+    return {
+        "latitude": [lat for lat, _ in coords],
+        "longitude": [lon for _, lon in coords],
+    }
+
+
+def _check_batch(responses: list, coords: list):
+    # The API answers a multi-location request with one response per
+    # coordinate, in request order; that order is how we demultiplex.
+    if len(responses) != len(coords):
+        raise RuntimeError(
+            f"Expected {len(coords)} responses for batched request, got {len(responses)}"
         )
-        response = responses[0]
-        hourly = response.Hourly()
-
-        data = {
-            "time": pd.date_range(
-                start=pd.to_datetime(hourly.Time(), unit="s", utc=True),
-                end=pd.to_datetime(hourly.TimeEnd(), unit="s", utc=True),
-                freq=pd.Timedelta(seconds=hourly.Interval()),
-                inclusive="left",
-            )
-        }
-        for i, var in enumerate(HOURLY_VARS):
-            data[var] = hourly.Variables(i).ValuesAsNumpy()
 
-        all_frames.append(pd.DataFrame(data))
-        start = chunk_end + timedelta(days=1)
-        time.sleep(2.0)
 
-    if not all_frames:
-        return pd.DataFrame()
+class ChunkSizer:
+    """Adaptive archive window for one batch of locations.
+
+    The window is capped so a single request never exceeds
+    MAX_REQUEST_WEIGHT. It doubles after a fast response and halves after
+    a rate-limit error, staying within CHUNK_MIN_DAYS..CHUNK_MAX_DAYS.
+    Time spent waiting on the shared limiter counts towards the response
+    time, so a throttled run does not keep growing its requests.
+    """
+
+    def __init__(self, n_vars: int, n_locations: int, days: int = CHUNK_DAYS):
+        self.n_vars = n_vars
+        self.n_locations = n_locations
+        self.max_days = CHUNK_MIN_DAYS
+        while (self.max_days < CHUNK_MAX_DAYS and
+               request_weight(self.max_days + 1, n_vars, n_locations) <= MAX_REQUEST_WEIGHT):
+            self.max_days += 1
+        self.days = max(CHUNK_MIN_DAYS, min(days, self.max_days))
+
+    def weight(self, n_days: int) -> float:
+        return request_weight(n_days, self.n_vars, self.n_locations)
+
+    def record(self, elapsed: float):
+        if elapsed < FAST_RESPONSE_SECONDS:
+            self.days = min(self.days * 2, self.max_days)
+
+    def shrink(self):
+        self.days = max(self.days // 2, CHUNK_MIN_DAYS)
+
+
+def iter_observations_batch(client, coords: list,
+                            start_date: str, end_date: str,
+                            limiter: RateLimiter | None = None,
+                            label: str = ""):
+    """Stream observations for several (lat, lon) pairs, one request per chunk.
+
+    `start_date` may name an hour ("YYYY-MM-DDTHH:MM"), in which case only
+    hours from then on are requested; `end_date` is fetched to its last hour.
+
+    Yields (frames, next_start) per chunk: one DataFrame per coordinate, in
+    the order given, and the first date not yet fetched. Nothing is kept
+    between chunks, so a consumer that writes each chunk out holds at most
+    one chunk in memory however long the backfill. Window size adapts to
+    response times and rate-limit errors (see ChunkSizer).
+    """
+    start = datetime.fromisoformat(start_date)
+    end = datetime.fromisoformat(end_date).replace(hour=23, minute=0)
+    sizer = ChunkSizer(len(HOURLY_VARS), len(coords))
+    rate_limited = 0
 
-    return pd.concat(all_frames, ignore_index=True)
+    while start <= end:
+        chunk_end = min(start.replace(hour=23) + timedelta(days=sizer.days - 1), end)
+        n_days = (chunk_end.date() - start.date()).days + 1
+        s_str = start.strftime("%Y-%m-%dT%H:%M")
+        e_str = chunk_end.strftime("%Y-%m-%dT%H:%M")
+        print(f"    {label + ' archive' if label else 'Archive'}: {s_str} → {e_str}")
 
+        began = time.monotonic()
+        try:
+            responses = api_call_with_rate_limit(
+                client,
+                "https://archive-api.open-meteo.com/v1/archive",
+                params={
+                    **_batch_params(coords),
+                    "start_hour": s_str,
+                    "end_hour": e_str,
+                    "hourly": HOURLY_VARS,
+                    "timezone": "UTC",
+                },
+                max_retries=1,
+                limiter=limiter,
+                weight=sizer.weight(n_days),
+            )
+        except RateLimitError:
+            rate_limited += 1
+            if rate_limited >= 5:
+                raise
+            sizer.shrink()
+            continue
+        rate_limited = 0
+        sizer.record(time.monotonic() - began)
 
-def fetch_forecast(client, lat: float, lon: float) -> tuple:
-    """Fetch forecast data. Returns (hourly_df, daily_df)."""
-    forecast_hourly_vars = HOURLY_VARS + FORECAST_EXTRA_HOURLY_VARS
-    responses = api_call_with_rate_limit(
-        client,
-        "https://api.open-meteo.com/v1/forecast",
-        params={
-            "latitude": lat,
-            "longitude": lon,
-            "hourly": forecast_hourly_vars,
-            "daily": DAILY_VARS,
-            "timezone": "UTC",
-        },
-    )
-    response = responses[0]
+        _check_batch(responses, coords)
+        frames = [_block_to_frame(r.Hourly(), HOURLY_VARS) for r in responses]
+        del responses
 
-    # Hourly
-    hourly = response.Hourly()
-    hourly_data = {
-        "time": pd.date_range(
-            start=pd.to_datetime(hourly.Time(), unit="s", utc=True),
-            end=pd.to_datetime(hourly.TimeEnd(), unit="s", utc=True),
-            freq=pd.Timedelta(seconds=hourly.Interval()),
-            inclusive="left",
-        )
-    }
-    for i, var in enumerate(forecast_hourly_vars):
-        hourly_data[var] = hourly.Variables(i).ValuesAsNumpy()
+        start = (chunk_end + timedelta(hours=1)).replace(hour=0)
+        yield frames, start.strftime("%Y-%m-%d")
+        if limiter is None:
+            time.sleep(2.0)
+            instrument.count("rate_limit_wait_seconds", 2.0)
 
-    hourly_df = pd.DataFrame(hourly_data)
 
-    # Daily
-    daily = response.Daily()
-    daily_data = {
-        "time": pd.date_range(
-            start=pd.to_datetime(daily.Time(), unit="s", utc=True),
-            end=pd.to_datetime(daily.TimeEnd(), unit="s", utc=True),
-            freq=pd.Timedelta(seconds=daily.Interval()),
-            inclusive="left",
+def fetch_forecast_batch(client, coords: list,
+                         limiter: RateLimiter | None = None) -> list:
+    """Fetch forecasts for several (lat, lon) pairs in one request.
+
+    Returns one (hourly_df, daily_df) tuple per coordinate, in the order given.
+    """
+    forecast_hourly_vars = HOURLY_VARS + FORECAST_EXTRA_HOURLY_VARS
+    with instrument.span("fetch_forecast", locations=len(coords)):
+        responses = api_call_with_rate_limit(
+            client,
+            "https://api.open-meteo.com/v1/forecast",
+            params={
+                **_batch_params(coords),
+                "hourly": forecast_hourly_vars,
+                "daily": DAILY_VARS,
+                "timezone": "UTC",
+            },
+            limiter=limiter,
+            weight=request_weight(16, len(forecast_hourly_vars), len(coords)),
         )
-    }
-    for i, var in enumerate(DAILY_VARS):
-        daily_data[var] = daily.Variables(i).ValuesAsNumpy()
+        _check_batch(responses, coords)
+
+        return [
+            (
+                _block_to_frame(response.Hourly(), forecast_hourly_vars),
+                _block_to_frame(response.Daily(), DAILY_VARS),
+            )
+            for response in responses
+        ]
 
-    daily_df = pd.DataFrame(daily_data)
 
-    return hourly_df, daily_df
+def fetch_forecast(client, lat: float, lon: float,
+                   limiter: RateLimiter | None = None) -> tuple:
+    """Fetch forecast data. Returns (hourly_df, daily_df)."""
+    return fetch_forecast_batch(client, [(lat, lon)], limiter)[0]
 
 
 # ─── Storage ─────────────────────────────────────────────────────────────────
 
 def save_json(df: pd.DataFrame, filepath: Path):
-    """Save a DataFrame as JSON."""
-    filepath.parent.mkdir(parents=True, exist_ok=True)
+    """Save a DataFrame as JSON (left untouched if the content is the same)."""
     # Convert timestamps to strings for JSON serialization
     out = df.copy()
     for col in out.select_dtypes(include=["datetime64[ns, UTC]", "datetime64[ns]"]).columns:
         out[col] = out[col].astype(str)
-    out.to_json(filepath, orient="records", indent=2)
-    print(f"    Saved JSON: {filepath}")
+    if storage.write_text_if_changed(filepath, out.to_json(orient="records", indent=2)):
+        print(f"    Saved JSON: {filepath}")
+    else:
+        print(f"    Unchanged JSON: {filepath}")
 
 
 def save_to_parquet(df: pd.DataFrame, archive_dir: Path, dedup_cols: list):
-    """Append data to monthly parquet files, deduplicating on dedup_cols."""
+    """Append data to the monthly archive as new delta files.
+
+    Only the new rows are written; dedup_cols are applied when the month is
+    read or compacted (see compact_archives).
+    """
     if df.empty:
         return
 
-    archive_dir.mkdir(parents=True, exist_ok=True)
+    for month, (path, rows) in archive.append(df, archive_dir, dedup_cols).items():
+        print(f"    Parquet: {path} ({rows} rows)")
 
-    # Group by year-month
-    df = df.copy()
-    df["_ym"] = df["time"].dt.tz_localize(None).dt.to_period("M")
 
-    for period, group in df.groupby("_ym"):
-        filename = archive_dir / f"{period}.parquet"
-        group = group.drop(columns=["_ym"])
+def compact_archive(archive_dir: Path, dedup_cols: list,
+                    min_deltas: int = archive.COMPACT_AFTER_DELTAS,
+                    rewrite: bool = False) -> dict:
+    """Compact one archive, except the append-only vintage archive, whose
+    finished issue days are sealed instead (see vintages.seal)."""
+    if archive_dir == FORECAST_VINTAGE_DIR:
+        return vintages.seal(archive_dir)
+    return archive.compact(archive_dir, dedup_cols, min_deltas, rewrite)
 
-        if filename.exists():
-            existing = pd.read_parquet(filename)
-            combined = pd.concat([existing, group], ignore_index=True)
-            combined = combined.drop_duplicates(subset=dedup_cols, keep="last")
-            combined = combined.sort_values(dedup_cols).reset_index(drop=True)
-            combined.to_parquet(filename, index=False)
-            row_count = len(combined)
-        else:
-            group = group.sort_values(dedup_cols).reset_index(drop=True)
-            group.to_parquet(filename, index=False)
-            row_count = len(group)
 
-        print(f"    Parquet: {filename} ({row_count} rows)")
+def compact_archives():
+    """Fold accumulated deltas into monthly base files where due. Run once
+    the fetch workers have finished, so nothing appends meanwhile."""
+    for archive_dir, dedup_cols in archive_dirs():
+        for month, rows in compact_archive(archive_dir, dedup_cols).items():
+            print(f"    Compacted: {archive_dir / month}.parquet ({rows} rows)")
 
 
 def get_last_observation_date(city: str, archive_dir: Path) -> str | None:
-    """Find the latest observation date for a city in the archive."""
-    parquet_files = sorted(archive_dir.glob("*.parquet"))
-    if not parquet_files:
-        return None
-
-    # Check the most recent file
-    df = pd.read_parquet(parquet_files[-1])
-    if "city" in df.columns:
-        city_data = df[df["city"] == city]
-        if city_data.empty:
-            return None
-        last_time = city_data["time"].max()
-    else:
-        last_time = df["time"].max()
+    """Find the latest observation date for a city, from the archive manifest."""
+    last_time = get_last_observation_time(city, archive_dir)
+    return None if last_time is None else last_time.strftime("%Y-%m-%d")
+
+
+def get_last_observation_time(city: str, archive_dir: Path) -> pd.Timestamp | None:
+    """Find the latest stored observation hour for a city, from the manifest."""
+    time_range = archive.city_time_range(archive_dir, city)
+    return None if time_range is None else time_range[1]
+
 
-    if pd.isna(last_time):
-        return None
+def archive_observations(city: str, obs_df: pd.DataFrame):
+    """Append a chunk of a city's fetched observations to the parquet archive.
 
-    return pd.Timestamp(last_time).strftime("%Y-%m-%d")
+    Rows identical to what is already stored are dropped first, so a
+    re-fetched hour that has not changed costs no write at all.
+    """
+    if obs_df.empty:
+        return
+    obs_df["city"] = city
+    changed = archive.changed_rows(obs_df, OBS_ARCHIVE_DIR, ["city", "time"])
+    if changed.empty:
+        print(f"    Parquet: {city} unchanged ({len(obs_df)} rows)")
+        return
+    save_to_parquet(changed, OBS_ARCHIVE_DIR, dedup_cols=["city", "time"])
+
+
+def save_observations(city: str, obs_df: pd.DataFrame):
+    """Write the latest JSON for a city's fetched (already archived) observations."""
+    if obs_df.empty:
+        print(f"    No observation data returned for {city}")
+        return
+
+    obs_df["city"] = city
+
+    # Save latest JSON (last 7 days of available data)
+    save_json(_recent(obs_df), OBS_DIR / f"{city}.json")
+
+
+def save_forecast(city: str, hourly_df: pd.DataFrame, daily_df: pd.DataFrame,
+                  issue_time: pd.Timestamp | None = None):
+    """Write a city's forecast to the latest JSON, its typed sidecar and the
+    vintage archive."""
+    hourly_df["city"] = city
+    daily_df["city"] = city
+
+    # Save latest JSON (hourly and daily combined into one file), each
+    # frame serialised once, compactly
+    def records(df):
+        return df.assign(time=df["time"].astype(str)).to_json(orient="records")
+
+    forecast_json = f'{{"hourly": {records(hourly_df)}, "daily": {records(daily_df)}}}'
+    forecast_path = FORECAST_DIR / f"{city}.json"
+    if storage.write_text_if_changed(forecast_path, forecast_json):
+        print(f"    Saved JSON: {forecast_path}")
+    else:
+        print(f"    Unchanged JSON: {forecast_path}")
+
+    # The hourly frame as decoded, for combine to load without parsing JSON
+    sidecar = pa.BufferOutputStream()
+    feather.write_feather(pa.Table.from_pandas(hourly_df, preserve_index=False), sidecar)
+    storage.write_bytes_if_changed(FORECAST_DIR / f"{city}.feather",
+                                   sidecar.getvalue().to_pybytes())
+
+    # Keep this issue alongside every earlier one (see vintages.py), unless
+    # the model has not been updated since the last one
+    issue_time = issue_time or vintages.issue_time_now()
+    if vintages.unchanged(FORECAST_VINTAGE_DIR, city, hourly_df, issue_time):
+        print(f"    Vintage: {city} unchanged since the previous issue")
+        return
+    for month, (path, rows) in vintages.append(
+            FORECAST_VINTAGE_DIR, city, hourly_df, issue_time).items():
+        print(f"    Vintage: {path} ({rows} rows)")
 
 
 # ─── Main ────────────────────────────────────────────────────────────────────
 
-def main():
+def _batched(items: list, size: int) -> list:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _coords(geo: dict, cities: list) -> list:
+    return [(geo[city]["latitude"], geo[city]["longitude"]) for city in cities]
+
+
+def _recent(df: pd.DataFrame, days: int = 7) -> pd.DataFrame:
+    """Rows within `days` of the newest row."""
+    if df.empty:
+        return df
+    return df[df["time"] >= df["time"].max() - timedelta(days=days)]
+
+
+def stream_observations(client, geo: dict, cities: list,
+                        start_date: str, end_date: str,
+                        limiter: RateLimiter, cursor: dict) -> list:
+    """Fetch a batch of cities' observations straight into the archive.
+
+    Each chunk is archived and the backfill cursor advanced before the next
+    is requested; only a rolling last-7-days tail per city is kept (for the
+    latest JSON), so memory stays at about one chunk. Returns the tails.
+    """
+    label = "/".join(cities)
+    tails = [pd.DataFrame() for _ in cities]
+    with instrument.span("fetch_observations", cities=label, start_date=start_date):
+        for frames, next_start in iter_observations_batch(
+                client, _coords(geo, cities), start_date, end_date, limiter, label):
+            for i, (city, frame) in enumerate(zip(cities, frames)):
+                with instrument.span("archive_observations", city=city, rows=len(frame)):
+                    archive_observations(city, frame)
+                tails[i] = _recent(pd.concat([tails[i], frame], ignore_index=True))
+            update_backfill_cursor(cursor, cities, next_start)
+    return tails
+
+
+def repair_observations(client, geo: dict, cities: list, month: str,
+                        end_date: str, limiter: RateLimiter):
+    """Fetch a quarantined month again, for the cities that lost rows.
+
+    Only [month start, end_date] is requested, straight into the archive
+    (rows already stored are skipped, see archive_observations). The
+    backfill cursor is left alone: an interrupted repair is simply run
+    again, since the month stays quarantined until one finishes.
+    """
+    label = "/".join(cities)
+    with instrument.span("repair_observations", cities=label, month=month):
+        for frames, _ in iter_observations_batch(
+                client, _coords(geo, cities), f"{month}-01", end_date, limiter, label):
+            for city, frame in zip(cities, frames):
+                archive_observations(city, frame)
+
+
+def main(max_workers: int = MAX_WORKERS, http2: bool = HTTP2):
     print("=" * 60)
     print("Open Meteo Weather Scraper")
     print("=" * 60)
 
+    instrument.reset()
+    try:
+        _run(max_workers, http2)
+    finally:
+        # Written for failed runs too; those are the ones worth looking at
+        run = instrument.write_report("scrape")
+        print(f"\nRun report: {instrument.REPORT_DIR / 'latest.jsonl'} "
+              f"({run['seconds']:.1f}s, {run['counters'].get('http_requests', 0)} HTTP requests)")
+
+    print("\n" + "=" * 60)
+    print("Done!")
+    print("=" * 60)
+
+
+def _run(max_workers: int, http2: bool):
     ensure_dirs()
-    client = setup_client()
+    session = setup_session(max_workers, http2)
+    client = setup_client(session)
+    limiter = setup_limiter()
 
     # Geocode
-    print("\n[1/3] Geocoding cities...")
-    geo = geocode_all_cities(CITIES)
+    print("\n[1/4] Geocoding cities...")
+    with instrument.span("geocode"):
+        geo = geocode_all_cities(CITIES, limiter, session)
 
     yesterday = (datetime.now(timezone.utc) - timedelta(days=1)).strftime("%Y-%m-%d")
 
-    # Observations
-    print("\n[2/3] Fetching historical observations...")
-    for city in CITIES:
-        info = geo[city]
-        lat, lon = info["latitude"], info["longitude"]
-        print(f"\n  {city} ({lat}, {lon})")
-
-        # Determine start date
-        last_date = get_last_observation_date(city, OBS_ARCHIVE_DIR)
-        if last_date:
-            start_date = last_date
-            print(f"    Resuming from {start_date}")
-        else:
-            start_date = HISTORY_START_DATE
-            print(f"    Full fetch from {start_date}")
-
-        obs_df = fetch_observations(client, lat, lon, start_date, yesterday)
-        if obs_df.empty:
-            print(f"    No observation data returned for {city}")
+    # Resume points are read before any worker starts, so no fetch races a
+    # write to the archive. An unfinished backfill's cursor wins over the
+    # archive, whose newest month may not contain that city yet.
+    cursor = load_backfill_cursor()
+
+    # Check every archive file before anything reads or appends. Months
+    # whose observation files had to be quarantined are fetched again: just
+    # those months, for just the cities that lost rows.
+    with instrument.span("verify_archives"):
+        for archive_dir, _ in archive_dirs():
+            archive.verify(archive_dir)
+    repairs = archive.quarantined_cities(OBS_ARCHIVE_DIR)
+    repair_batches = []
+    repaired = {}  # city -> {month: last day re-fetched}
+    for month, cities in repairs.items():
+        cities = CITIES if cities is None else [c for c in cities if c in CITIES]
+        end_date = min(pd.Period(month, "M").end_time.strftime("%Y-%m-%d"), yesterday)
+        if not cities or f"{month}-01" > end_date:
             continue
+        print(f"  Re-fetching {month} for {', '.join(cities)} to restore quarantined files")
+        repair_batches += [(month, end_date, batch) for batch in _batched(cities, BATCH_SIZE)]
+        for city in cities:
+            repaired.setdefault(city, {})[month] = end_date
 
-        obs_df["city"] = city
-
-        # Save latest JSON (last 7 days of available data)
-        latest_time = obs_df["time"].max()
-        cutoff = latest_time - timedelta(days=7)
-        recent_df = obs_df[obs_df["time"] >= cutoff]
-        save_json(recent_df, OBS_DIR / f"{city}.json")
-
-        # Save to parquet archive
-        save_to_parquet(obs_df, OBS_ARCHIVE_DIR, dedup_cols=["city", "time"])
-
-        time.sleep(REQUEST_DELAY)
-
-    # Forecasts
-    print("\n[3/3] Fetching forecasts...")
+    start_dates = {}
     for city in CITIES:
-        info = geo[city]
-        lat, lon = info["latitude"], info["longitude"]
-        print(f"\n  {city} ({lat}, {lon})")
-
-        hourly_df, daily_df = fetch_forecast(client, lat, lon)
-        hourly_df["city"] = city
-        daily_df["city"] = city
-
-        # Save latest JSON (hourly and daily combined into one file)
-        forecast_data = {
-            "hourly": json.loads(hourly_df.assign(
-                time=hourly_df["time"].astype(str)
-            ).to_json(orient="records")),
-            "daily": json.loads(daily_df.assign(
-                time=daily_df["time"].astype(str)
-            ).to_json(orient="records")),
-        }
-        forecast_path = FORECAST_DIR / f"{city}.json"
-        with open(forecast_path, "w") as f:
-            json.dump(forecast_data, f, indent=2)
-        print(f"    Saved JSON: {forecast_path}")
-
-        # Save hourly to parquet archive
-        save_to_parquet(hourly_df, FORECAST_ARCHIVE_DIR, dedup_cols=["city", "time"])
-
-        time.sleep(REQUEST_DELAY)
+        last_time = get_last_observation_time(city, OBS_ARCHIVE_DIR)
+        if city in cursor:
+            start_dates[city] = cursor[city]
+            print(f"  {city}: resuming interrupted backfill from {cursor[city]}")
+        elif last_time is not None:
+            # Only the hours after the newest stored one are requested, and
+            # not those a repair is about to fetch anyway
+            next_hour = last_time + timedelta(hours=1)
+            while True:
+                last_day = repaired.get(city, {}).get(next_hour.strftime("%Y-%m"))
+                if last_day is None or next_hour.strftime("%Y-%m-%d") > last_day:
+                    break
+                next_hour = pd.Timestamp(last_day, tz="UTC") + timedelta(days=1)
+            if next_hour.strftime("%Y-%m-%d") > yesterday:
+                print(f"  {city}: observations up to date ({last_time:%Y-%m-%d %H:%M})")
+                continue
+            start_dates[city] = next_hour.strftime("%Y-%m-%dT%H:%M")
+            print(f"  {city}: resuming observations from {start_dates[city]}")
+        else:
+            start_dates[city] = HISTORY_START_DATE
+            print(f"  {city}: full observation fetch from {HISTORY_START_DATE}")
+
+    # Cities resuming from the same hour can share one multi-location request
+    obs_batches = []
+    by_start = {}
+    for city, start_date in start_dates.items():
+        by_start.setdefault(start_date, []).append(city)
+    for start_date, cities in by_start.items():
+        obs_batches += [
+            (start_date, batch) for batch in _batched(cities, BATCH_SIZE)
+        ]
+    forecast_batches = _batched(CITIES, BATCH_SIZE)
+    issue_time = vintages.issue_time_now()
+
+    n_batches = len(obs_batches) + len(forecast_batches) + len(repair_batches)
+    print(f"\n[2/4] Fetching observations and forecasts ({len(CITIES)} cities, "
+          f"{n_batches} batches, {max_workers} workers)...")
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        obs_futures = {}
+        forecast_futures = {}
+        repair_futures = [
+            pool.submit(repair_observations, client, geo, batch, month, end_date, limiter)
+            for month, end_date, batch in repair_batches
+        ]
+        for start_date, batch in obs_batches:
+            obs_futures[pool.submit(
+                stream_observations, client, geo, batch,
+                start_date, yesterday, limiter, cursor,
+            )] = batch
+        for batch in forecast_batches:
+            forecast_futures[pool.submit(
+                fetch_forecast_batch, client, _coords(geo, batch), limiter,
+            )] = batch
+
+        # The frames are kept for combine, which would otherwise read back
+        # what was just written
+        fetched_obs = {}
+        forecasts = {}
+        print("\n[3/4] Saving observations and forecasts...")
+        for future in as_completed(obs_futures):
+            batch = obs_futures[future]
+            for city, obs_df in zip(batch, future.result()):
+                print(f"\n  {city} observations")
+                with instrument.span("save_observations", city=city):
+                    save_observations(city, obs_df)
+                fetched_obs[city] = obs_df
+            update_backfill_cursor(cursor, batch, None)
+        for future in as_completed(repair_futures):
+            future.result()
+        if repairs:
+            archive.clear_quarantine(OBS_ARCHIVE_DIR, list(repairs))
+
+        for future in as_completed(forecast_futures):
+            for city, (hourly_df, daily_df) in zip(forecast_futures[future], future.result()):
+                print(f"\n  {city} forecast")
+                with instrument.span("save_forecast", city=city):
+                    save_forecast(city, hourly_df, daily_df, issue_time)
+                forecasts[city] = hourly_df
+
+    with instrument.span("compact"):
+        compact_archives()
 
     # Combine observations + forecasts into per-city JSON for the dashboard
     print("\n[4/4] Combining data for dashboard...")
     from combine import main as combine_main
-    combine_main()
+    timezones = {city: geo[city]["timezone"] for city in CITIES if city in geo}
+    with instrument.span("combine"):
+        combine_main(city_timezones=timezones, forecasts=forecasts, fetched=fetched_obs)
 
-    print("\n" + "=" * 60)
-    print("Done!")
-    print("=" * 60)
+    # Verify forecast vintages against the observations that have come in
+    from forecast_skill import main as skill_main
+    with instrument.span("forecast_skill"):
+        skill_main()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--workers", type=int, default=MAX_WORKERS,
+        help="number of cities fetched concurrently (1 = sequential)",
+    )
+    parser.add_argument(
+        "--http2", action="store_true", default=HTTP2,
+        help="negotiate HTTP/2 (no response cache)",
+    )
+    args = parser.parse_args()
+    main(max_workers=args.workers, http2=args.http2)
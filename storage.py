@@ -0,0 +1,99 @@
+"""
+File-writing helpers shared by the scraper, combine and the archive.
+
+Every write goes to a temporary file next to its target, is fsynced, and is
+renamed over the target, so a reader (or the next run, after a crash or a
+cancelled workflow) sees either the old file or the new one, never a
+truncated mix. Temporary files are named ".<name>.<id>.tmp" and are never
+matched by the archive's "*.parquet" globs; remove_stale_tmp() clears any
+left behind by a killed process.
+"""
+
+import json
+import os
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+import instrument
+
+TMP_SUFFIX = ".tmp"
+
+
+def _fsync_dir(directory: Path):
+    """Persist a rename (a no-op where directories cannot be opened)."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_path(path: Path):
+    """Yield a temporary path to write `path`'s new contents to.
+
+    When the block finishes, the temporary file is fsynced and renamed over
+    `path`; if it raises, the temporary file is removed and `path` is left
+    as it was.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}{TMP_SUFFIX}")
+    try:
+        yield tmp
+        with open(tmp, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    _fsync_dir(path.parent)
+
+
+def write_bytes(path: Path, data: bytes):
+    with atomic_path(path) as tmp:
+        tmp.write_bytes(data)
+    instrument.file_written(path, len(data))
+
+
+def write_json(path: Path, data, **kwargs):
+    """Atomically write `data` as JSON (kwargs go to json.dumps)."""
+    write_bytes(path, json.dumps(data, **kwargs).encode())
+
+
+def write_bytes_if_changed(path: Path, data: bytes) -> bool:
+    """Atomically write `data` to `path` unless the file already holds it.
+
+    Returns True if the file was written. Skipping identical writes keeps
+    unchanged outputs out of the hourly commit and saves the I/O.
+    """
+    try:
+        if path.stat().st_size == len(data) and path.read_bytes() == data:
+            return False
+    except FileNotFoundError:
+        pass
+    write_bytes(path, data)
+    return True
+
+
+def write_text_if_changed(path: Path, text: str) -> bool:
+    """write_bytes_if_changed for text."""
+    return write_bytes_if_changed(path, text.encode())
+
+
+def remove_stale_tmp(directory: Path) -> int:
+    """Delete temporary files left under `directory` by interrupted writes.
+
+    Only call this when no other process is writing there. Returns the
+    number removed.
+    """
+    removed = 0
+    for tmp in directory.rglob(f".*{TMP_SUFFIX}"):
+        tmp.unlink(missing_ok=True)
+        removed += 1
+    return removed
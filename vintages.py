@@ -0,0 +1,144 @@
+"""
+Forecast vintages: every issued forecast, kept.
+
+The forecast archive keyed on (city, time) keeps only the newest forecast
+for each hour. Here every scraper run's hourly forecast is appended as it
+was issued, keyed by (city, issue_time, time), to an archive (see
+archive.py) partitioned by issue day (UTC). A run only ever adds one delta
+per city, and since the manifest still records each day's valid-time
+range, queries by valid time skip issue days that cannot overlap.
+
+The archive is never compacted like the others, which would rewrite an
+ever larger month many times a day. Once an issue day is over, nothing
+is added to it again, so seal() folds its deltas into one file for the
+day, written once.
+
+Columns: the forecast variables plus
+
+    issue_time   when the forecast was fetched, floored to the hour (UTC)
+    time         valid time
+    lead_hours   time - issue_time, in whole hours (negative for the hours
+                 of the forecast day that had already passed)
+"""
+
+from pathlib import Path
+
+import pandas as pd
+
+import archive
+
+DEDUP_COLS = ["city", "issue_time", "time"]
+PARTITION_COL = "issue_time"
+PARTITION_FREQ = "D"
+
+# Longest lead the forecast API returns; bounds which issues can cover an hour
+FORECAST_HORIZON = pd.Timedelta(days=16)
+
+
+def issue_time_now() -> pd.Timestamp:
+    return pd.Timestamp.now(tz="UTC").floor("h")
+
+
+def append(vintage_dir: Path, city: str, hourly_df: pd.DataFrame,
+           issue_time: pd.Timestamp) -> dict:
+    """Add one issued forecast for a city. Returns archive.append's result."""
+    if hourly_df.empty:
+        return {}
+    df = hourly_df.copy()
+    df["city"] = city
+    df["issue_time"] = issue_time
+    df["lead_hours"] = ((df["time"] - issue_time) // pd.Timedelta(hours=1)).astype("int16")
+    return archive.append(df, vintage_dir, DEDUP_COLS, partition_col=PARTITION_COL,
+                          partition_freq=PARTITION_FREQ)
+
+
+def seal(vintage_dir: Path, now: pd.Timestamp | None = None) -> dict:
+    """Fold every finished issue day's deltas into one file for the day.
+
+    Days before today (UTC) get no more issues, so each day file is written
+    once; today's deltas wait for tomorrow. Returns {day: row_count}.
+    """
+    today = (now or issue_time_now()).strftime("%Y-%m-%d")
+    return {
+        day: archive.compact_month(vintage_dir, day, DEDUP_COLS)
+        for day in archive.months(vintage_dir)
+        if day < today and archive.delta_paths(vintage_dir, day)
+    }
+
+
+def unchanged(vintage_dir: Path, city: str, hourly_df: pd.DataFrame,
+              issue_time: pd.Timestamp) -> bool:
+    """Whether the latest stored issue already says exactly this for every
+    hour of `hourly_df` (so appending it would add nothing)."""
+    if hourly_df.empty:
+        return True
+    latest = latest_as_of(vintage_dir, city, issue_time,
+                          valid_since=hourly_df["time"].min(),
+                          valid_until=hourly_df["time"].max() + pd.Timedelta(hours=1))
+    variables = [c for c in hourly_df.columns if c not in DEDUP_COLS]
+    if latest.empty or set(variables) - set(latest.columns):
+        return False
+    new = hourly_df.set_index("time")[variables]
+    old = latest.set_index("time").reindex(new.index)[variables].astype(new.dtypes)
+    return bool(((new == old) | (new.isna() & old.isna())).all().all())
+
+
+def _issue_days(vintage_dir: Path, city: str,
+                issued_since: pd.Timestamp | None, issued_until: pd.Timestamp | None,
+                valid_since: pd.Timestamp | None, valid_until: pd.Timestamp | None) -> list:
+    keys = archive.city_months(vintage_dir, city, since=valid_since, until=valid_until)
+    if issued_since is not None:
+        keys = [k for k in keys if k >= issued_since.strftime("%Y-%m-%d")]
+    if issued_until is not None:
+        keys = [k for k in keys if k <= issued_until.strftime("%Y-%m-%d")]
+    return keys
+
+
+def read(vintage_dir: Path, city: str,
+         issued_since: pd.Timestamp | None = None,
+         issued_until: pd.Timestamp | None = None,
+         valid_since: pd.Timestamp | None = None,
+         valid_until: pd.Timestamp | None = None,
+         columns: list | None = None, where: list | None = None) -> pd.DataFrame:
+    """Every vintage for a city issued in [issued_since, issued_until] and
+    valid in [valid_since, valid_until), with all filters pushed down."""
+    where = list(where or [])
+    if issued_since is not None:
+        where.append(("issue_time", ">=", issued_since))
+    if issued_until is not None:
+        where.append(("issue_time", "<=", issued_until))
+    day_keys = _issue_days(vintage_dir, city, issued_since, issued_until,
+                           valid_since, valid_until)
+    if not day_keys:
+        return pd.DataFrame()
+    if columns is not None:
+        columns = list(dict.fromkeys(["lead_hours"] + list(columns)))
+    return archive.read(vintage_dir, DEDUP_COLS, city, day_keys, columns,
+                        valid_since, valid_until, where)
+
+
+def latest_as_of(vintage_dir: Path, city: str, as_of: pd.Timestamp,
+                 valid_since: pd.Timestamp | None = None,
+                 valid_until: pd.Timestamp | None = None,
+                 columns: list | None = None) -> pd.DataFrame:
+    """The forecast as it stood at `as_of`: for each valid time, the row
+    from the newest issue at or before `as_of`."""
+    issued_since = None if valid_since is None else valid_since - FORECAST_HORIZON
+    df = read(vintage_dir, city, issued_since, as_of, valid_since, valid_until, columns)
+    if df.empty:
+        return df
+    df = df.sort_values(["time", "issue_time"]).drop_duplicates("time", keep="last")
+    return df.reset_index(drop=True)
+
+
+def at_lead(vintage_dir: Path, city: str, lead_hours: int | tuple,
+            valid_since: pd.Timestamp | None = None,
+            valid_until: pd.Timestamp | None = None,
+            columns: list | None = None) -> pd.DataFrame:
+    """Forecasts made `lead_hours` ahead (an int, or a (lo, hi) half-open
+    range), one row per issue and valid time."""
+    lo, hi = (lead_hours, lead_hours + 1) if isinstance(lead_hours, int) else lead_hours
+    issued_since = None if valid_since is None else valid_since - pd.Timedelta(hours=hi)
+    issued_until = None if valid_until is None else valid_until - pd.Timedelta(hours=lo)
+    return read(vintage_dir, city, issued_since, issued_until, valid_since, valid_until,
+                columns, where=[("lead_hours", ">=", lo), ("lead_hours", "<", hi)])